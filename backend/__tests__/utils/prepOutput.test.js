@@ -0,0 +1,38 @@
+/**
+ * Unit tests for prepOutput.js
+ */
+
+import { parsePreparedFiles } from '../../utils/prepOutput.js';
+
+describe('Prepare Output Parser', () => {
+  describe('parsePreparedFiles', () => {
+    test('should collect basenames from success lines', () => {
+      const output = [
+        '🔧 Preparing receptor: a.pdb...',
+        '✅ Receptor prepared: /up/a_receptor.pdbqt',
+        '✅ Success: /up/a_receptor.pdbqt',
+        '✅ Success: /up/b_receptor.pdbqt',
+        ''
+      ].join('\n');
+
+      const prepared = parsePreparedFiles(output);
+      expect([...prepared].sort()).toEqual(['a_receptor.pdbqt', 'b_receptor.pdbqt']);
+    });
+
+    test('should ignore progress lines that only mention a file', () => {
+      const output = '✅ Receptor prepared: /up/c_receptor.pdbqt\n❌ reduce failed: boom\n';
+      expect(parsePreparedFiles(output).size).toBe(0);
+    });
+
+    test('should handle CRLF line endings', () => {
+      const output = '✅ Success: /up/a_receptor.pdbqt\r\n';
+      expect(parsePreparedFiles(output).has('a_receptor.pdbqt')).toBe(true);
+    });
+
+    test('should handle missing output', () => {
+      expect(parsePreparedFiles('').size).toBe(0);
+      expect(parsePreparedFiles(null).size).toBe(0);
+      expect(parsePreparedFiles(undefined).size).toBe(0);
+    });
+  });
+});
@@ -3,25 +3,47 @@ import csv
 from datetime import datetime
 from pathlib import Path
 import subprocess
-import pandas as pd
 import sys
 import shutil
 import concurrent.futures
+import multiprocessing
 import os
 import json
+import atexit
+import functools
+import mmap
+import re
+import threading
+import time
 
 # ----------------------
 # Configuración de rutas
 # ----------------------
 WORKDIR = os.environ.get("WORKDIR", "/app/workdir")
 
+# Tamaño del buffer de escritura para los archivos de resultados (CSV y TXT)
+RESULTS_BUFFER_SIZE = 1 << 20
+# Tamaño de bloque al leer la salida estándar de Vina
+VINA_READ_CHUNK_SIZE = 1 << 16
+# Bytes iniciales de cada ligando inspeccionados para validar que tiene átomos
+LIGAND_PEEK_SIZE = 4096
+
+CONFIGS = []
+CONFIG = {}
+
 # ----------------------
 # Leer configuración pasada desde Node.js como JSON
 # ----------------------
-CONFIGS = []
-if len(sys.argv) > 1:
+def load_configs(argv):
+    """
+    Lee la configuración JSON recibida desde Node.js (objeto único o array de objetos).
+    Se invoca solo desde el proceso principal: los workers del pool importan este
+    módulo sin argumentos y no deben terminar con sys.exit.
+    """
+    if len(argv) <= 1:
+        sys.exit("No se recibió configuración desde Node.js")
     try:
-        config_json = json.loads(sys.argv[1])
+        config_json = json.loads(argv[1])
 
         # Soportar tanto un objeto único como un array de objetos
         if isinstance(config_json, list):
@@ -29,6 +51,7 @@ if len(sys.argv) > 1:
         else:
             configs_list = [config_json]
 
+        configs = []
         for cfg in configs_list:
             config = {
                 'receptor': cfg['receptor'],
@@ -43,49 +66,84 @@ if len(sys.argv) > 1:
                 'exhaustiveness': str(cfg.get('exhaustiveness', '8')),
                 'parallel_workers': cfg.get('parallel_workers', None)
             }
-            CONFIGS.append(config)
-
-        # Mantener CONFIG para compatibilidad
-        CONFIG = CONFIGS[0] if CONFIGS else {}
+            configs.append(config)
+        return configs
     except Exception as e:
         sys.exit(f"Error parsing JSON config from Node.js: {e}")
-else:
-    sys.exit("No se recibió configuración desde Node.js")
 
 # ----------------------
 # Funciones del script
 # ----------------------
+HISTORIAL_ENCABEZADOS = [
+    "fecha_inicio", "hora_inicio", "fecha_fin", "hora_fin",
+    "receptor", "ligandos_procesados", "exhaustividad",
+    "parallel_workers", "output_dir", "estado", "observaciones"
+]
+
+# Filas pendientes de escribir en historial.csv (se vuelcan una sola vez al final)
+_HISTORIAL_BUFFER = []
+
 def actualizar_historial(parametros, estado, observaciones):
+    ahora = datetime.now()
+    fecha_fin = ahora.strftime("%Y-%m-%d")
+    hora_fin = ahora.strftime("%H:%M:%S")
+    # Mismo orden que HISTORIAL_ENCABEZADOS
+    fila = (
+        parametros.get("fecha_inicio_fecha", ""),
+        parametros.get("hora_inicio_hora", ""),
+        fecha_fin,
+        hora_fin,
+        parametros.get("receptor", ""),
+        parametros.get("ligandos_procesados", ""),
+        parametros.get("exhaustividad", ""),
+        parametros.get("parallel_workers", ""),
+        parametros.get("output_dir", ""),
+        estado,
+        observaciones
+    )
+    _HISTORIAL_BUFFER.append(fila)
+
+def flush_historial():
+    """
+    Escribe en historial.csv todas las filas acumuladas con una sola apertura del archivo.
+    """
+    if not _HISTORIAL_BUFFER:
+        return
     historial_dir = Path(WORKDIR) / "historial_ejecuciones"
     historial_dir.mkdir(parents=True, exist_ok=True)
     historial_file = historial_dir / "historial.csv"
-    encabezados = [
-        "fecha_inicio", "hora_inicio", "fecha_fin", "hora_fin",
-        "receptor", "ligandos_procesados", "exhaustividad",
-        "parallel_workers", "output_dir", "estado", "observaciones"
-    ]
     escribir_encabezados = not historial_file.exists()
-    ahora = datetime.now()
-    fecha_fin = ahora.strftime("%Y-%m-%d")
-    hora_fin = ahora.strftime("%H:%M:%S")
-    fila = {
-        "fecha_inicio": parametros.get("fecha_inicio_fecha", ""),
-        "hora_inicio": parametros.get("hora_inicio_hora", ""),
-        "fecha_fin": fecha_fin,
-        "hora_fin": hora_fin,
-        "receptor": parametros.get("receptor", ""),
-        "ligandos_procesados": parametros.get("ligandos_procesados", ""),
-        "exhaustividad": parametros.get("exhaustividad", ""),
-        "parallel_workers": parametros.get("parallel_workers", ""),
-        "output_dir": parametros.get("output_dir", ""),
-        "estado": estado,
-        "observaciones": observaciones
-    }
     with open(historial_file, 'a', newline='', encoding='utf-8') as f:
-        writer = csv.DictWriter(f, fieldnames=encabezados)
+        writer = csv.writer(f)
         if escribir_encabezados:
-            writer.writeheader()
-        writer.writerow(fila)
+            writer.writerow(HISTORIAL_ENCABEZADOS)
+        writer.writerows(_HISTORIAL_BUFFER)
+    _HISTORIAL_BUFFER.clear()
+
+# ----------------------
+# Consultas al sistema de archivos cacheadas por ruta: varios receptores
+# suelen compartir el mismo directorio de ligandos
+# ----------------------
+@functools.lru_cache(maxsize=None)
+def _resolve(path_str):
+    return str(Path(path_str).resolve())
+
+@functools.lru_cache(maxsize=None)
+def _exists(path_str):
+    return Path(path_str).exists()
+
+@functools.lru_cache(maxsize=None)
+def _is_dir(path_str):
+    return Path(path_str).is_dir()
+
+@functools.lru_cache(maxsize=None)
+def _list_pdbqt(dir_str):
+    """
+    Lista (cacheada por directorio) de los archivos .pdbqt de un directorio de ligandos.
+    os.scandir obtiene el tipo de cada entrada del propio listado, sin un stat por archivo.
+    """
+    with os.scandir(dir_str) as entries:
+        return tuple(e.path for e in entries if e.name.endswith('.pdbqt') and e.is_file())
 
 def parse_config(config_dict):
     """
@@ -120,9 +178,9 @@ def parse_config(config_dict):
         config['parallel_workers'] = None
 
     # Convertir rutas a absolutas
-    config['receptor'] = str(Path(config['receptor']).resolve())
-    config['ligand_dir'] = str(Path(config['ligand_dir']).resolve())
-    config['output_base'] = str(Path(config['output_base']).resolve())
+    config['receptor'] = _resolve(config['receptor'])
+    config['ligand_dir'] = _resolve(config['ligand_dir'])
+    config['output_base'] = _resolve(config['output_base'])
 
     return config
 
@@ -132,27 +190,19 @@ def find_configs(configs_dir):
         return []
     return sorted([str(f) for f in configs_dir.glob("*.txt")])
 
-def validate_paths(config):
-    errors = []
-    receptor_path = Path(config['receptor'])
-    ligand_dir_path = Path(config['ligand_dir'])
-    output_base_path = Path(config['output_base'])
-    if not receptor_path.exists():
-        errors.append(f"Archivo receptor no encontrado (ruta absoluta): {receptor_path}")
-    if not ligand_dir_path.is_dir():
-        errors.append(f"Directorio de ligandos no encontrado (ruta absoluta): {ligand_dir_path}")
-    else:
-        ligands = list(ligand_dir_path.glob('*.pdbqt'))
-        if not ligands:
-            errors.append(f"No hay archivos PDBQT en (ruta absoluta): {ligand_dir_path}")
-    if not output_base_path.exists():
-        try:
-            output_base_path.mkdir(parents=True, exist_ok=True)
-        except Exception as e:
-            errors.append(f"No se pudo crear el directorio de salida: {output_base_path} ({e})")
+# Resultado de la sonda de Vina por ejecutable: mensaje de error o None si está disponible
+_VINA_PROBE_CACHE = {}
+_VINA_VERSION_RE = re.compile(r"[Vv]ina\s*([0-9]+\.[0-9]+)")
 
-    # Validar que Vina esté disponible
-    vina_exec = os.environ.get("VINA_PATH", "vina")
+def _probe_vina(vina_exec):
+    """
+    Comprueba que Vina responde y avisa si la versión es anterior a 1.2.
+    El resultado se cachea por ejecutable para no relanzar el proceso en cada receptor.
+    """
+    if vina_exec in _VINA_PROBE_CACHE:
+        return _VINA_PROBE_CACHE[vina_exec]
+
+    error = None
     try:
         # First try --version for newer vina builds, fall back to --help
         try:
@@ -161,12 +211,11 @@ def validate_paths(config):
             result = subprocess.run([vina_exec, "--help"], capture_output=True, text=True, timeout=5)
 
         if result.returncode != 0:
-            errors.append(f"AutoDock Vina no está disponible en: {vina_exec}")
+            error = f"AutoDock Vina no está disponible en: {vina_exec}"
         else:
             # Try to detect version (if present) and warn if older than 1.2
             out = (result.stdout or result.stderr or "").strip()
-            import re
-            m = re.search(r"[Vv]ina\s*([0-9]+\.[0-9]+)", out)
+            m = _VINA_VERSION_RE.search(out)
             if m:
                 try:
                     ver = float(m.group(1))
@@ -175,9 +224,37 @@ def validate_paths(config):
                 except Exception:
                     pass
     except FileNotFoundError:
-        errors.append(f"AutoDock Vina no encontrado en: {vina_exec}")
+        error = f"AutoDock Vina no encontrado en: {vina_exec}"
     except Exception as e:
-        errors.append(f"Error verificando AutoDock Vina: {e}")
+        error = f"Error verificando AutoDock Vina: {e}"
+
+    _VINA_PROBE_CACHE[vina_exec] = error
+    return error
+
+def validate_paths(config):
+    errors = []
+    receptor_path = Path(config['receptor'])
+    ligand_dir_path = Path(config['ligand_dir'])
+    output_base_path = Path(config['output_base'])
+    if not _exists(str(receptor_path)):
+        errors.append(f"Archivo receptor no encontrado (ruta absoluta): {receptor_path}")
+    if not _is_dir(str(ligand_dir_path)):
+        errors.append(f"Directorio de ligandos no encontrado (ruta absoluta): {ligand_dir_path}")
+    else:
+        ligands = _list_pdbqt(str(ligand_dir_path))
+        if not ligands:
+            errors.append(f"No hay archivos PDBQT en (ruta absoluta): {ligand_dir_path}")
+    if not output_base_path.exists():
+        try:
+            output_base_path.mkdir(parents=True, exist_ok=True)
+        except Exception as e:
+            errors.append(f"No se pudo crear el directorio de salida: {output_base_path} ({e})")
+
+    # Validar que Vina esté disponible (la sonda se ejecuta una sola vez por ejecutable)
+    vina_exec = os.environ.get("VINA_PATH", "vina")
+    vina_error = _probe_vina(vina_exec)
+    if vina_error:
+        errors.append(vina_error)
 
     if errors:
         sys.exit("\n".join(["\nERRORES:"] + errors))
@@ -188,52 +265,161 @@ def validate_paths(config):
 # Mantén todo el código de run_docking y save_results como en la versión original
 # Solo asegurarse de usar CONFIG_FILE, DEFAULT_RECEPTOR y DEFAULT_LIGAND_DIR según los argumentos
 
+# Filas de la tabla de modos de Vina: "mode  affinity  rmsd l.b.  rmsd u.b."
+_ENERGY_RE = re.compile(r'^[ \t]*([1-9]\d*)[ \t]+(\S+)[ \t]+(\S+)[ \t]+(\S+)', re.MULTILINE)
+
 def parse_energies(output):
-    energies = []
-    for line in output.split('\n'):
-        if line.strip().startswith(tuple(str(n) for n in range(1, 10))):
-            parts = line.strip().split()
-            if len(parts) >= 4:
-                energies.append({
-                    'Mode': parts[0],
-                    'Energy (kcal/mol)': parts[1],
-                    'RMSD lower': parts[2],
-                    'RMSD upper': parts[3]
-                })
+    """
+    Devuelve las filas de la tabla de Vina como tuplas (mode, affinity, rmsd l.b., rmsd u.b.).
+    """
+    energies = _ENERGY_RE.findall(output)
     if not energies:
-        energies = [{'Mode': 'N/A', 'Energy (kcal/mol)': 'N/A', 'RMSD lower': 'N/A', 'RMSD upper': 'N/A'}]
+        energies = [('N/A', 'N/A', 'N/A', 'N/A')]
     return energies
 
+# Bloques MODEL ... ENDMDL de la salida de Vina (contenido sin las líneas MODEL/ENDMDL)
+_MODEL_RE = re.compile(rb'^MODEL[^\n]*\n(.*?)^ENDMDL', re.MULTILINE | re.DOTALL)
+# Líneas ATOM/HETATM recortadas a las 66 columnas del formato PDB
+_ATOM_LINE_RE = re.compile(rb'^(?=ATOM|HETATM)([^\n]{0,66})[^\n]*', re.MULTILINE)
+
 def split_pdbqt_models(output_file):
-    models = []
-    current_model = []
-    with open(output_file, 'r') as f:
-        for line in f:
-            if line.startswith('MODEL'):
-                current_model = []
-            elif line.startswith('ENDMDL'):
-                models.append(current_model)
-                current_model = []
-            else:
-                current_model.append(line)
+    with open(output_file, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return []
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            models = [m.group(1) for m in _MODEL_RE.finditer(mm)]
     pdb_files = []
     for i, model in enumerate(models, 1):
         if not model:
             continue
         pdb_file = output_file.parent / f"{output_file.stem}_model_{i}.pdb"
-        with open(pdb_file, 'w') as f:
-            for line in model:
-                if line.startswith('ATOM') or line.startswith('HETATM'):
-                    f.write(line[:66] + '\n')
-                else:
-                    f.write(line)
+        pdb_file.write_bytes(_ATOM_LINE_RE.sub(rb'\1', model))
         pdb_files.append(pdb_file)
     return pdb_files
 
-def run_docking(configs, output_dir=None):
+# Registros de átomos en un ligando PDBQT
+_ATOM_RECORD_RE = re.compile(rb'^(?:ATOM|HETATM)', re.MULTILINE)
+
+def _has_atom_records(ligand):
+    """
+    Comprueba que el ligando no está vacío y contiene líneas ATOM/HETATM.
+    Normalmente basta con los primeros LIGAND_PEEK_SIZE bytes; solo si ahí no
+    aparece ningún átomo se lee el resto del archivo.
+    """
+    with open(ligand, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return False
+        head = f.read(LIGAND_PEEK_SIZE)
+        if _ATOM_RECORD_RE.search(head):
+            return True
+        return _ATOM_RECORD_RE.search(head + f.read()) is not None
+
+def process_ligand(ligand, config, protein_folder, protein_name):
+    """
+    Ejecuta Vina para un ligando. Se define a nivel de módulo para poder
+    enviarse a los workers del ProcessPoolExecutor.
+    """
+    ligand = Path(ligand)
+    protein_folder = Path(protein_folder)
+    lig_output_dir = protein_folder / ligand.stem
+    lig_output_dir.mkdir(exist_ok=True)
+    output_pdbqt = lig_output_dir / f"{ligand.stem}_docked.pdbqt"
+    vina_stdout_file = lig_output_dir / "vina_output.txt"
+    vina_stderr_file = lig_output_dir / "vina_stderr.txt"
+
+    # Print progress with protein and ligand info
+    print(f"🔬 [{protein_name}] Processing ligand: {ligand.stem}", flush=True)
+
+    try:
+        has_atoms = _has_atom_records(ligand)
+    except Exception as e:
+        return [{'Ligand': ligand.stem, 'Error': str(e), 'Protein': protein_name}], \
+               [{'Ligand': ligand.stem, 'mode': 'ERROR', 'affinity (kcal/mol)': 'N/A', 'dist from best mode': str(e), 'Protein': protein_name}]
+    if not has_atoms:
+        return [{'Ligand': ligand.stem, 'Error': 'Archivo .pdbqt vacío o sin líneas ATOM/HETATM', 'Protein': protein_name}], \
+               [{'Ligand': ligand.stem, 'mode': 'ERROR', 'affinity (kcal/mol)': 'N/A', 'dist from best mode': 'Archivo .pdbqt vacío o sin líneas ATOM/HETATM', 'Protein': protein_name}]
+
+    vina_exec = os.environ.get("VINA_PATH", "vina")
+    cmd = [
+        vina_exec,
+        '--receptor', config['receptor'],
+        '--ligand', str(ligand),
+        '--center_x', config['center_x'],
+        '--center_y', config['center_y'],
+        '--center_z', config['center_z'],
+        '--size_x', config['size_x'],
+        '--size_y', config['size_y'],
+        '--size_z', config['size_z'],
+        '--exhaustiveness', config['exhaustiveness'],
+        '--out', str(output_pdbqt),
+        # Paralelismo externo: un ligando por worker, un núcleo por Vina
+        '--cpu', '1'
+    ]
+    try:
+        # La salida de Vina se vuelca directamente a disco; stdout se conserva
+        # además en memoria para extraer las energías
+        with open(vina_stdout_file, "wb") as out_f, open(vina_stderr_file, "wb") as err_f:
+            proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=err_f)
+            stdout_chunks = []
+            for chunk in iter(lambda: proc.stdout.read(VINA_READ_CHUNK_SIZE), b''):
+                out_f.write(chunk)
+                stdout_chunks.append(chunk)
+            proc.stdout.close()
+            returncode = proc.wait()
+        if returncode != 0:
+            raise subprocess.CalledProcessError(returncode, cmd)
+        energies = parse_energies(b''.join(stdout_chunks).decode(errors='replace'))
+        pdb_files = split_pdbqt_models(output_pdbqt)
+    except Exception as e:
+        return [{'Ligand': ligand.stem, 'Error': str(e), 'Protein': protein_name}], \
+               [{'Ligand': ligand.stem, 'mode': 'ERROR', 'affinity (kcal/mol)': 'N/A', 'dist from best mode': str(e), 'Protein': protein_name}]
+    ligand_name = ligand.stem
+    excel_records = []
+    txt_records = []
+    for mode, energy, rmsd_lower, rmsd_upper in energies:
+        excel_records.append({
+            'Ligand': ligand_name,
+            'Mode': mode,
+            'Energy (kcal/mol)': energy,
+            'RMSD lower': rmsd_lower,
+            'RMSD upper': rmsd_upper,
+            'Protein': protein_name
+        })
+        txt_records.append({
+            'Ligand': ligand_name,
+            'mode': mode,
+            'affinity (kcal/mol)': energy,
+            'dist from best mode': rmsd_lower,
+            'Protein': protein_name
+        })
+    return excel_records, txt_records
+
+def _discard_folder(folder):
+    """
+    Aparta una carpeta de resultados anterior renombrándola y la borra en segundo
+    plano, para que el docking pueda empezar sin esperar al rmtree.
+    Devuelve el hilo de borrado (o None si la carpeta no existía).
+    """
+    if not folder.exists():
+        return None
+    stale = folder.with_name(f".stale_{folder.name}_{os.getpid()}_{int(time.time())}")
+    os.rename(folder, stale)
+    cleanup = threading.Thread(target=shutil.rmtree, args=(stale,), kwargs={'ignore_errors': True})
+    cleanup.start()
+    return cleanup
+
+def _new_pool(max_workers):
+    """Crea el pool de procesos (contexto forkserver) que ejecuta process_ligand."""
+    return concurrent.futures.ProcessPoolExecutor(
+        max_workers=max_workers,
+        mp_context=multiprocessing.get_context("forkserver")
+    )
+
+def run_docking(configs, output_dir=None, executor=None):
     """
     Ejecuta el docking usando las configuraciones dadas.
     Si se proporciona output_dir, todas las carpetas de proteínas y ligandos se crearán dentro de esa ruta.
+    Si se proporciona executor, se reutiliza ese pool de procesos en lugar de crear uno por receptor.
     Devuelve el diccionario protein_results habitual.
     """
     if not isinstance(configs, list):
@@ -248,97 +434,53 @@ def run_docking(configs, output_dir=None):
 
     protein_results = {}
     for config in configs:
-        ligand_dir = Path(config['ligand_dir'])
-        ligands = list(ligand_dir.glob('*.pdbqt'))
+        ligands = [Path(p) for p in _list_pdbqt(config['ligand_dir'])]
         protein_name = Path(config['receptor']).stem
         protein_folder = output_dir / protein_name
-        if protein_folder.exists():
-            shutil.rmtree(protein_folder)
+        cleanup = _discard_folder(protein_folder)
         protein_folder.mkdir(parents=True, exist_ok=True)
 
-        def process_ligand(ligand):
-            lig_output_dir = protein_folder / ligand.stem
-            lig_output_dir.mkdir(exist_ok=True)
-            output_pdbqt = lig_output_dir / f"{ligand.stem}_docked.pdbqt"
-            vina_stdout_file = lig_output_dir / "vina_output.txt"
-            vina_stderr_file = lig_output_dir / "vina_stderr.txt"
+        # Un hueco por ligando, preasignado y rellenado por índice al completar cada futuro
+        excel_slots = [None] * len(ligands)
+        txt_slots = [None] * len(ligands)
+        max_workers = config['parallel_workers'] if config['parallel_workers'] is not None else multiprocessing.cpu_count()
+        print(f"\n🔄 [{protein_name}] Processing {len(ligands)} ligands...\n", flush=True)
+        own_executor = executor is None
+        pool = _new_pool(max_workers) if own_executor else executor
+        try:
+            # Como mucho max_workers ligandos en vuelo, aunque el pool compartido sea mayor
+            pending = {}
+            ligand_iter = iter(enumerate(ligands))
 
-            # Print progress with protein and ligand info
-            print(f"🔬 [{protein_name}] Processing ligand: {ligand.stem}", flush=True)
+            def submit_next():
+                item = next(ligand_iter, None)
+                if item is not None:
+                    pending[pool.submit(process_ligand, item[1], config, str(protein_folder), protein_name)] = item
 
-            try:
-                with open(ligand, "r") as f:
-                    lines = f.readlines()
-            except Exception as e:
-                return [{'Ligand': ligand.stem, 'Error': str(e), 'Protein': protein_name}], \
-                       [{'Ligand': ligand.stem, 'mode': 'ERROR', 'affinity (kcal/mol)': 'N/A', 'dist from best mode': str(e), 'Protein': protein_name}]
-            if not lines or not any(line.startswith("ATOM") or line.startswith("HETATM") for line in lines):
-                return [{'Ligand': ligand.stem, 'Error': 'Archivo .pdbqt vacío o sin líneas ATOM/HETATM', 'Protein': protein_name}], \
-                       [{'Ligand': ligand.stem, 'mode': 'ERROR', 'affinity (kcal/mol)': 'N/A', 'dist from best mode': 'Archivo .pdbqt vacío o sin líneas ATOM/HETATM', 'Protein': protein_name}]
-
-            vina_exec = os.environ.get("VINA_PATH", "vina")
-            cmd = [
-                vina_exec,
-                '--receptor', config['receptor'],
-                '--ligand', str(ligand),
-                '--center_x', config['center_x'],
-                '--center_y', config['center_y'],
-                '--center_z', config['center_z'],
-                '--size_x', config['size_x'],
-                '--size_y', config['size_y'],
-                '--size_z', config['size_z'],
-                '--exhaustiveness', config['exhaustiveness'],
-                '--out', str(output_pdbqt)
-            ]
-            try:
-                result = subprocess.run(cmd, capture_output=True, text=True, check=True)
-                with open(vina_stdout_file, "w") as f:
-                    f.write(result.stdout)
-                with open(vina_stderr_file, "w") as f:
-                    f.write(result.stderr)
-                energies = parse_energies(result.stdout)
-                pdb_files = split_pdbqt_models(output_pdbqt)
-            except Exception as e:
-                return [{'Ligand': ligand.stem, 'Error': str(e), 'Protein': protein_name}], \
-                       [{'Ligand': ligand.stem, 'mode': 'ERROR', 'affinity (kcal/mol)': 'N/A', 'dist from best mode': str(e), 'Protein': protein_name}]
-            excel_records = []
-            txt_records = []
-            for energy in energies:
-                excel_records.append({
-                    'Ligand': ligand.stem,
-                    'Mode': energy['Mode'],
-                    'Energy (kcal/mol)': energy['Energy (kcal/mol)'],
-                    'RMSD lower': energy['RMSD lower'],
-                    'RMSD upper': energy['RMSD upper'],
-                    'Protein': protein_name
-                })
-                txt_records.append({
-                    'Ligand': ligand.stem,
-                    'mode': energy['Mode'],
-                    'affinity (kcal/mol)': energy['Energy (kcal/mol)'],
-                    'dist from best mode': energy['RMSD lower'],
-                    'Protein': protein_name
-                })
-            return excel_records, txt_records
-
-        excel_results = []
-        txt_results = []
-        max_workers = config['parallel_workers'] if config['parallel_workers'] is not None else None
-        print(f"\n🔄 [{protein_name}] Processing {len(ligands)} ligands...\n", flush=True)
-        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
-            futures = {executor.submit(process_ligand, ligand): ligand for ligand in ligands}
+            for _ in range(max_workers):
+                submit_next()
             completed = 0
-            for future in concurrent.futures.as_completed(futures):
-                ligand = futures[future]
-                completed += 1
-                try:
-                    e, t = future.result()
-                    excel_results.extend(e)
-                    txt_results.extend(t)
-                    print(f"✅ [{protein_name}] [{completed}/{len(ligands)}] {ligand.stem} completado", flush=True)
-                except Exception as e:
-                    excel_results.append({'Ligand': ligand.stem, 'Error': str(e), 'Protein': protein_name})
-                    txt_results.append({'Ligand': ligand.stem, 'mode': 'ERROR', 'affinity (kcal/mol)': 'N/A', 'dist from best mode': str(e), 'Protein': protein_name})
+            while pending:
+                done, _ = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    slot, ligand = pending.pop(future)
+                    completed += 1
+                    try:
+                        excel_slots[slot], txt_slots[slot] = future.result()
+                        print(f"✅ [{protein_name}] [{completed}/{len(ligands)}] {ligand.stem} completado", flush=True)
+                    except Exception as e:
+                        excel_slots[slot] = [{'Ligand': ligand.stem, 'Error': str(e), 'Protein': protein_name}]
+                        txt_slots[slot] = [{'Ligand': ligand.stem, 'mode': 'ERROR', 'affinity (kcal/mol)': 'N/A', 'dist from best mode': str(e), 'Protein': protein_name}]
+                    submit_next()
+        finally:
+            if own_executor:
+                pool.shutdown()
+        if cleanup is not None:
+            # No dejar restos de la ejecución anterior en los resultados
+            cleanup.join()
+        # Resultados en el orden de los ligandos, independiente del orden de finalización
+        excel_results = [row for rows in excel_slots if rows for row in rows]
+        txt_results = [row for rows in txt_slots if rows for row in rows]
         protein_results[protein_name] = {'excel': excel_results, 'txt': txt_results, 'output_dir': protein_folder}
     return protein_results
 
@@ -354,112 +496,138 @@ def save_results(protein_results, output_dir=None):
         out_dir = result['output_dir']
         out_dir.mkdir(parents=True, exist_ok=True)
 
-        # Guardar CSV con resultados principales
-        df_excel = pd.DataFrame(excel_data)
-        drop_cols = ['RMSD lower', 'RMSD upper']
-        df_csv_main = df_excel.drop(columns=[c for c in drop_cols if c in df_excel.columns], errors='ignore')
-        csv_path = out_dir / f"{protein_name}_results.csv"
-        df_csv_main.to_csv(csv_path, index=False)
-        print(f"💾 CSV saved: {csv_path}", flush=True)
-
-        # Guardar CSV con información extra
+        # Guardar CSV con resultados principales y CSV con información extra
+        # en una sola pasada sobre excel_data
+        main_cols = ['Ligand', 'Mode', 'Energy (kcal/mol)', 'Protein']
+        if any('Error' in row for row in excel_data):
+            main_cols.append('Error')
         extra_cols = ['Ligand', 'Mode', 'RMSD lower', 'RMSD upper']
-        df_extra = df_excel[[c for c in extra_cols if c in df_excel.columns]]
+        csv_path = out_dir / f"{protein_name}_results.csv"
         extra_csv_path = out_dir / f"{protein_name}_extra.csv"
-        df_extra.to_csv(extra_csv_path, index=False)
+        with open(csv_path, 'w', newline='', buffering=RESULTS_BUFFER_SIZE) as f_main, \
+             open(extra_csv_path, 'w', newline='', buffering=RESULTS_BUFFER_SIZE) as f_extra:
+            main_writer = csv.writer(f_main)
+            extra_writer = csv.writer(f_extra)
+            main_writer.writerow(main_cols)
+            extra_writer.writerow(extra_cols)
+            with_error = 'Error' in main_cols
+            for row in excel_data:
+                get = row.get
+                ligand = get('Ligand', '')
+                mode = get('Mode', '')
+                main_row = (ligand, mode, get('Energy (kcal/mol)', ''), get('Protein', ''))
+                if with_error:
+                    main_row += (get('Error', ''),)
+                main_writer.writerow(main_row)
+                extra_writer.writerow((ligand, mode, get('RMSD lower', ''), get('RMSD upper', '')))
+        print(f"💾 CSV saved: {csv_path}", flush=True)
         print(f"💾 Extra CSV saved: {extra_csv_path}", flush=True)
 
         # Guardar archivo TXT con resultados formateados
         txt_path = out_dir / f"{protein_name}_results.txt"
-        with open(txt_path, 'w') as f:
-            f.write(f"{'='*60}\n")
-            f.write(f"Resultados de Docking - {protein_name}\n")
-            f.write(f"{'='*60}\n\n")
-            current_ligand = None
-            for entry in txt_data:
-                if entry['Ligand'] != current_ligand:
-                    current_ligand = entry['Ligand']
-                    f.write(f"\n▶ Ligand: {current_ligand}\n")
-                    f.write("| mode | affinity | dist from best mode |\n")
-                    f.write("-" * 50 + "\n")
-                if entry['mode'] == 'ERROR':
-                    f.write(f"⚠ Error: {entry['dist from best mode']}\n")
-                else:
-                    f.write(f"{entry['mode']}  {entry['affinity (kcal/mol)']}    {entry['dist from best mode']}\n")
+        parts = [
+            f"{'='*60}\n",
+            f"Resultados de Docking - {protein_name}\n",
+            f"{'='*60}\n\n"
+        ]
+        append = parts.append
+        current_ligand = None
+        for entry in txt_data:
+            if entry['Ligand'] != current_ligand:
+                current_ligand = entry['Ligand']
+                append(f"\n▶ Ligand: {current_ligand}\n"
+                       "| mode | affinity | dist from best mode |\n"
+                       f"{'-' * 50}\n")
+            if entry['mode'] == 'ERROR':
+                append(f"⚠ Error: {entry['dist from best mode']}\n")
+            else:
+                append(f"{entry['mode']}  {entry['affinity (kcal/mol)']}    {entry['dist from best mode']}\n")
+        with open(txt_path, 'w', buffering=RESULTS_BUFFER_SIZE) as f:
+            f.write(''.join(parts))
         print(f"💾 TXT saved: {txt_path}", flush=True)
 
 def main():
     print("\n🚀 Starting AutoDock Vina Batch Docking\n")
     print(f"📊 Processing {len(CONFIGS)} receptor(s)...\n")
 
-    import multiprocessing
     cpu_count = multiprocessing.cpu_count()
 
-    # Procesar cada configuración (cada receptor)
-    for idx, config_raw in enumerate(CONFIGS, 1):
-        config = parse_config(config_raw)
+    # Persistir el historial aunque la ejecución termine antes de tiempo (sys.exit)
+    atexit.register(flush_historial)
+
+    # Procesar cada configuración (cada receptor) sobre un único pool de procesos
+    with _new_pool(cpu_count) as pool:
+        for idx, config_raw in enumerate(CONFIGS, 1):
+            config = parse_config(config_raw)
 
-        if config.get('parallel_workers') is not None:
-            if config['parallel_workers'] > cpu_count:
+            if config.get('parallel_workers') is None:
+                # Un worker (y un Vina con --cpu 1) por núcleo
                 config['parallel_workers'] = cpu_count
-            elif config['parallel_workers'] < 1:
-                config['parallel_workers'] = 1
-
-        validate_paths(config)
-
-        now_inicio = datetime.now()
-        fecha_inicio_fecha = now_inicio.strftime("%Y-%m-%d")
-        fecha_inicio_hora = now_inicio.strftime("%H:%M:%S")
-
-        ligand_dir = Path(config['ligand_dir'])
-        ligands = list(ligand_dir.glob("*.pdbqt"))
-        ligandos_procesados_list = [lig.stem for lig in ligands]
-        ligandos_procesados_str = ','.join(ligandos_procesados_list)
-
-        # Usar el nombre del receptor como código de proteína
-        protein_code = Path(config['receptor']).stem
-        output_base = config['output_base']
-        config['output_base'] = output_base
-
-        batch_output_dir = Path(output_base)
-        batch_output_dir.mkdir(parents=True, exist_ok=True)
-
-        parametros = {
-            "fecha_inicio_fecha": fecha_inicio_fecha,
-            "hora_inicio": fecha_inicio_hora,
-            "receptor": config.get('receptor', ''),
-            "ligandos_procesados": ligandos_procesados_str,
-            "exhaustividad": config.get('exhaustiveness', ''),
-            "parallel_workers": config.get('parallel_workers', ''),
-            "output_dir": str(batch_output_dir)
-        }
+            else:
+                if config['parallel_workers'] > cpu_count:
+                    config['parallel_workers'] = cpu_count
+                elif config['parallel_workers'] < 1:
+                    config['parallel_workers'] = 1
+
+            validate_paths(config)
+
+            now_inicio = datetime.now()
+            fecha_inicio_fecha = now_inicio.strftime("%Y-%m-%d")
+            fecha_inicio_hora = now_inicio.strftime("%H:%M:%S")
+
+            ligands = _list_pdbqt(config['ligand_dir'])
+            ligandos_procesados_list = [Path(lig).stem for lig in ligands]
+            ligandos_procesados_str = ','.join(ligandos_procesados_list)
+
+            # Usar el nombre del receptor como código de proteína
+            protein_code = Path(config['receptor']).stem
+            output_base = config['output_base']
+            config['output_base'] = output_base
+
+            batch_output_dir = Path(output_base)
+            batch_output_dir.mkdir(parents=True, exist_ok=True)
+
+            parametros = {
+                "fecha_inicio_fecha": fecha_inicio_fecha,
+                "hora_inicio": fecha_inicio_hora,
+                "receptor": config.get('receptor', ''),
+                "ligandos_procesados": ligandos_procesados_str,
+                "exhaustividad": config.get('exhaustiveness', ''),
+                "parallel_workers": config.get('parallel_workers', ''),
+                "output_dir": str(batch_output_dir)
+            }
 
-        try:
-            print(f"\n{'='*60}")
-            print(f"[{idx}/{len(CONFIGS)}] Processing: {protein_code}")
-            print(f"{'='*60}")
-            print("\n⚙️ Configuration used:")
-            print(f"• Receptor: {config['receptor']}")
-            print(f"• Ligand directory: {config['ligand_dir']}")
-            print(f"• Docking center: [{config['center_x']}, {config['center_y']}, {config['center_z']}]")
-            print(f"• Box size: {config['size_x']}x{config['size_y']}x{config['size_z']} Å")
-            print(f"• Exhaustiveness: {config['exhaustiveness']}\n")
-
-            protein_results = run_docking(config, output_dir=batch_output_dir)
-            save_results(protein_results, output_dir=batch_output_dir)
-
-            for protein_name, result in protein_results.items():
-                print(f"\n✅ [{idx}/{len(CONFIGS)}] Process completed! Results in: {result['output_dir']}\n")
-
-            actualizar_historial(parametros, "OK", f"Execution completed successfully for {protein_code}")
-        except Exception as e:
-            observaciones = str(e)
-            actualizar_historial(parametros, "Error", f"{observaciones} (config: {protein_code})")
-            print(f"\n❌ Error in {protein_code}: {observaciones}\n")
+            try:
+                print(f"\n{'='*60}")
+                print(f"[{idx}/{len(CONFIGS)}] Processing: {protein_code}")
+                print(f"{'='*60}")
+                print("\n⚙️ Configuration used:")
+                print(f"• Receptor: {config['receptor']}")
+                print(f"• Ligand directory: {config['ligand_dir']}")
+                print(f"• Docking center: [{config['center_x']}, {config['center_y']}, {config['center_z']}]")
+                print(f"• Box size: {config['size_x']}x{config['size_y']}x{config['size_z']} Å")
+                print(f"• Exhaustiveness: {config['exhaustiveness']}\n")
+
+                protein_results = run_docking(config, output_dir=batch_output_dir, executor=pool)
+                save_results(protein_results, output_dir=batch_output_dir)
+
+                for protein_name, result in protein_results.items():
+                    print(f"\n✅ [{idx}/{len(CONFIGS)}] Process completed! Results in: {result['output_dir']}\n")
+
+                actualizar_historial(parametros, "OK", f"Execution completed successfully for {protein_code}")
+            except Exception as e:
+                observaciones = str(e)
+                actualizar_historial(parametros, "Error", f"{observaciones} (config: {protein_code})")
+                print(f"\n❌ Error in {protein_code}: {observaciones}\n")
+
+    flush_historial()
 
     print(f"\n{'='*60}")
     print(f"🎉 All receptors processed!")
     print(f"{'='*60}\n")
 
 if __name__ == '__main__':
+    CONFIGS = load_configs(sys.argv)
+    # Mantener CONFIG para compatibilidad
+    CONFIG = CONFIGS[0] if CONFIGS else {}
     main()
\ No newline at end of file
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Long-lived worker for Meeko command-line tools
+Reads one JSON job per line on stdin, runs the requested tool in-process and
+writes one JSON reply per line on stdout. RDKit/Meeko are imported by the
+first job and stay loaded for the following ones.
+
+Job:   {"op": "prep_receptor" | "prep_ligand", "args": ["-r", "in.pdb", ...]}
+Reply: {"returncode": 0, "output": "..."}
+       {"unsupported": true} when the tool is not a Python script and has to be
+       launched as a normal subprocess by the caller
+"""
+
+import functools
+import io
+import json
+import runpy
+import shutil
+import sys
+from contextlib import redirect_stderr, redirect_stdout
+
+TOOLS = {
+    'prep_receptor': 'mk_prepare_receptor.py',
+    'prep_ligand': 'mk_prepare_ligand.py',
+}
+
+
+def is_python_script(path: str) -> bool:
+    """True if path is a Python source file (judged by its shebang)"""
+    try:
+        with open(path, 'rb') as f:
+            first_line = f.readline(256)
+    except OSError:
+        return False
+    return first_line.startswith(b'#!') and b'python' in first_line
+
+
+@functools.lru_cache(maxsize=None)
+def resolve_tool(tool: str):
+    """(path, is_python) for a tool on PATH, looked up once per worker"""
+    script = shutil.which(tool)
+    return script, script is not None and is_python_script(script)
+
+
+def run_job(job: dict) -> dict:
+    """Run one tool invocation as if it had been started from the command line"""
+    tool = TOOLS.get(job.get('op'))
+    if tool is None:
+        return {'returncode': 2, 'output': f"Unknown op: {job.get('op')}"}
+    script, is_python = resolve_tool(tool)
+    if script is None:
+        return {'returncode': 127, 'output': f"{tool} not found in PATH"}
+    if not is_python:
+        return {'unsupported': True}
+
+    captured = io.StringIO()
+    saved_argv = sys.argv
+    sys.argv = [script] + [str(a) for a in job.get('args', [])]
+    returncode = 0
+    try:
+        with redirect_stdout(captured), redirect_stderr(captured):
+            runpy.run_path(script, run_name='__main__')
+    except SystemExit as e:
+        if isinstance(e.code, int):
+            returncode = e.code
+        elif e.code is not None:
+            captured.write(str(e.code))
+            returncode = 1
+    except Exception as e:
+        captured.write(f"{type(e).__name__}: {e}")
+        returncode = 1
+    finally:
+        sys.argv = saved_argv
+    return {'returncode': returncode, 'output': captured.getvalue()}
+
+
+def main():
+    for line in sys.stdin:
+        if not line.strip():
+            continue
+        try:
+            reply = run_job(json.loads(line))
+        except ValueError as e:
+            reply = {'returncode': 2, 'output': f"Invalid job: {e}"}
+        sys.stdout.write(json.dumps(reply) + '\n')
+        sys.stdout.flush()
+
+
+if __name__ == "__main__":
+    main()
@@ -9,10 +9,24 @@ import os
 import sys
 import subprocess
 import json
+import mmap
+import select
 import shutil
+import gzip
+import hashlib
+import uuid
+import zlib
+import asyncio
+import threading
+import concurrent.futures
+import multiprocessing
+import functools
 from pathlib import Path
 import requests
-from typing import Optional, List, Tuple
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from typing import Callable, Iterator, Optional, List, Tuple
+from meeko_worker import TOOLS as MEEKO_TOOLS
 
 # Try to import Meeko
 try:
@@ -22,16 +36,335 @@ except ImportError:
     MEEKO_AVAILABLE = False
     print("⚠️  Warning: Meeko not available. Some features will be limited.", file=sys.stderr)
 
+# Conformers embedded per SMILES when force-field optimization is requested: scaled with
+# flexibility (rotatable bonds cubed) between these bounds
+FF_OPT_CONFORMERS = 10
+FF_OPT_MAX_CONFORMERS = 50
+
+# Seconds an external tool (reduce, scrub, Meeko scripts) may run before it is retried/abandoned;
+# PREP_TOOL_TIMEOUT raises it for very large receptors
+SUBPROCESS_TIMEOUT = float(os.environ.get('PREP_TOOL_TIMEOUT', 120))
+# Extra seconds per SMILES granted to the single scrub run that processes a whole catalog
+SCRUB_SECONDS_PER_SMILES = 5
+# SMILES per scrub run: a failing or stuck run only costs its own chunk of the catalog
+SCRUB_BATCH_SIZE = 1000
+
+# Optional: httpx lets download-pdbs multiplex every request over one HTTP/2 connection
+try:
+    import httpx
+    HTTPX_AVAILABLE = True
+    try:
+        import h2  # noqa: F401  (needed by httpx for http2=True)
+        HTTP2_AVAILABLE = True
+    except ImportError:
+        HTTP2_AVAILABLE = False
+except ImportError:
+    HTTPX_AVAILABLE = False
+    HTTP2_AVAILABLE = False
+
+# Optional: orjson parses large CLI path lists several times faster than json
+# (orjson.JSONDecodeError subclasses json.JSONDecodeError, so error handling is shared)
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
+
 # Try to import RDKit
 try:
     from rdkit import Chem
-    from rdkit.Chem import AllChem
+    from rdkit.Chem import AllChem, rdMolDescriptors
     RDKIT_AVAILABLE = True
 except ImportError:
     RDKIT_AVAILABLE = False
     print("⚠️  Warning: RDKit not available. SMILES conversion will be limited.", file=sys.stderr)
 
 
+@functools.lru_cache(maxsize=None)
+def _which(executable: str) -> str:
+    """Absolute path of an executable on PATH, looked up once; unchanged if not found"""
+    return shutil.which(executable) or executable
+
+
+def _existing_paths(paths) -> set:
+    """Subset of paths that exist, listing each parent directory once with os.scandir"""
+    by_dir = {}
+    for path in paths:
+        by_dir.setdefault(os.path.dirname(path) or '.', []).append(path)
+    present = set()
+    for directory, dir_paths in by_dir.items():
+        try:
+            with os.scandir(directory) as entries:
+                names = {entry.name for entry in entries}
+        except OSError:
+            continue
+        present.update(path for path in dir_paths if os.path.basename(path) in names)
+    return present
+
+
+def _write_and_close(pipe, data: bytes) -> None:
+    """Write data to a subprocess pipe and close it; a process that exits early is not an error"""
+    try:
+        pipe.write(data)
+    except BrokenPipeError:
+        pass
+    finally:
+        try:
+            pipe.close()
+        except BrokenPipeError:
+            pass
+
+
+def _link_or_copy(source: Path, dest: Path) -> None:
+    """Hard-link source as dest (no bytes copied), copying when links are not possible
+
+    An existing dest is replaced, unless it already is the source file.
+    """
+    if dest.exists():
+        if os.path.samefile(source, dest):
+            return
+        dest.unlink()
+    try:
+        os.link(source, dest)
+    except OSError:
+        # Different filesystem, or one that does not support hard links
+        shutil.copy2(source, dest)
+
+
+def _file_sha256(path: Path) -> str:
+    """SHA-256 of a file's contents, read in large blocks"""
+    with open(path, 'rb') as f:
+        if hasattr(hashlib, 'file_digest'):
+            return hashlib.file_digest(f, 'sha256').hexdigest()
+        h = hashlib.sha256()
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+        return h.hexdigest()
+
+
+def _is_prepared(pdbqt_path: Path, digest: str) -> bool:
+    """True if pdbqt_path was produced from an input with this digest (see _mark_prepared)"""
+    sidecar = pdbqt_path.with_name(pdbqt_path.name + '.sha256')
+    try:
+        return pdbqt_path.exists() and sidecar.read_text().strip() == digest
+    except OSError:
+        return False
+
+
+def _mark_prepared(pdbqt_path: Path, digest: str) -> None:
+    """Record the input digest next to a freshly prepared PDBQT"""
+    pdbqt_path.with_name(pdbqt_path.name + '.sha256').write_text(digest)
+
+
+def _docking_etkdg_params():
+    """ETKDGv3 parameters for a single embed: fixed seed, all cores, capped iterations"""
+    params = AllChem.ETKDGv3()
+    params.randomSeed = 42
+    params.numThreads = 0
+    params.maxIterations = 200
+    params.pruneRmsThresh = 0.5
+    params.useSmallRingTorsions = True
+    return params
+
+
+def _ensemble_size(mol) -> int:
+    """Number of conformers to embed before force-field selection, adapted to flexibility"""
+    nrot = rdMolDescriptors.CalcNumRotatableBonds(mol)
+    return min(FF_OPT_MAX_CONFORMERS, max(FF_OPT_CONFORMERS, nrot ** 3))
+
+
+def _keep_lowest_energy_conformer(mol, cids: List[int], smiles: str, ligand_name: str) -> None:
+    """Minimize all conformers of mol in parallel and drop all but the lowest-energy one
+
+    MMFF94s (planar amide/aniline N) is used when it has parameters for every atom,
+    UFF otherwise. SMILES with cis/trans bonds are not minimized at all (force fields
+    can flip the double-bond geometry) and keep their first ETKDG conformer; if no
+    conformer converges, the ETKDG coordinates are kept as well.
+    """
+    keep = cids[0]
+    if '/' in smiles or '\\' in smiles:
+        print(f"⚠️  {ligand_name}: cis/trans stereo in SMILES, skipping force-field optimization", flush=True)
+    else:
+        etkdg = Chem.Mol(mol)
+        if AllChem.MMFFHasAllMoleculeParams(mol):
+            results = AllChem.MMFFOptimizeMoleculeConfs(mol, numThreads=0, maxIters=500, mmffVariant='MMFF94s')
+        else:
+            results = AllChem.UFFOptimizeMoleculeConfs(mol, numThreads=0, maxIters=500)
+        # (0, energy) = converged; 1 = not converged, -1 = force field setup failed
+        converged = [i for i, (status, _) in enumerate(results) if status == 0]
+        if converged:
+            keep = cids[min(converged, key=lambda i: results[i][1])]
+        else:
+            print(f"⚠️  {ligand_name}: force field did not converge, using pre-optimization coordinates", flush=True)
+            mol.RemoveAllConformers()
+            mol.AddConformer(etkdg.GetConformer(keep), assignId=False)
+            return
+    for cid in cids:
+        if cid != keep:
+            mol.RemoveConformer(cid)
+
+
+@functools.lru_cache(maxsize=None)
+def _smiles_parser_params():
+    """SmilesParserParams shared by every parse (built on first use, RDKit is optional)"""
+    params = Chem.SmilesParserParams()
+    params.sanitize = True
+    params.removeHs = False  # explicit [H] are kept; AddHs follows anyway
+    return params
+
+
+@functools.lru_cache(maxsize=100_000)
+def _canonical_smiles(smiles: str) -> Optional[str]:
+    """Canonical form of a SMILES string, or None if it does not parse
+
+    Memoized on the input string so repeated catalog entries are parsed once; only the
+    canonical strings are cached, each Mol is dropped right after canonicalization.
+    """
+    mol = Chem.MolFromSmiles(smiles, _smiles_parser_params())
+    return Chem.MolToSmiles(mol) if mol is not None else None
+
+
+def _read_sdf_records(sdf_path: Path) -> Iterator[Tuple[int, object]]:
+    """Yield (record number, mol) pairs in file order, keeping explicit H
+
+    Records are parsed and sanitized on all cores when RDKit has
+    MultithreadedSDMolSupplier. It yields them slightly out of order, so records that
+    arrive ahead of a slower one wait in a small buffer; the file is never held whole.
+    """
+    if not hasattr(Chem, 'MultithreadedSDMolSupplier'):
+        yield from enumerate(Chem.SDMolSupplier(str(sdf_path), removeHs=False), 1)
+        return
+    suppl = Chem.MultithreadedSDMolSupplier(str(sdf_path), removeHs=False,
+                                            numWriterThreads=os.cpu_count() or 1)
+    pending = {}
+    next_id = 1
+    for mol in suppl:
+        record_id = suppl.GetLastRecordId()
+        if mol is None and (record_id < next_id or record_id in pending):
+            # End-of-input marker: an extra None that repeats an id already seen
+            continue
+        pending[record_id] = mol
+        while next_id in pending:
+            yield next_id, pending.pop(next_id)
+            next_id += 1
+    # Record ids the supplier skipped must not hold back the records after them
+    for record_id in sorted(pending):
+        yield record_id, pending[record_id]
+
+
+def _count_lines(buf) -> int:
+    """Number of lines in a byte array (newlines + 1); compiled by _smiles_line_scanner"""
+    lines = 1
+    for i in range(buf.size):
+        if buf[i] == 10:
+            lines += 1
+    return lines
+
+
+def _scan_smiles_lines(buf, rows) -> int:
+    """Fill rows with (line number, SMILES start, SMILES end, name start, name end); returns the row count
+
+    Compiled by _smiles_line_scanner. Offsets index buf; name start is -1 when a line
+    has no name. Blank lines and lines whose first token starts with '#' produce no
+    row. Whitespace is the same set bytes.split() uses.
+    """
+    n = buf.size
+    count = 0
+    line_no = 0
+    i = 0
+    while i < n:
+        line_no += 1
+        tokens = 0
+        s0 = s1 = n0 = n1 = -1
+        while i < n and buf[i] != 10:
+            c = buf[i]
+            if c == 32 or 9 <= c <= 13:
+                i += 1
+                continue
+            start = i
+            while i < n and not (buf[i] == 32 or 9 <= buf[i] <= 13):
+                i += 1
+            if tokens == 0:
+                s0, s1 = start, i
+            elif tokens == 1:
+                n0, n1 = start, i
+            tokens += 1
+        i += 1
+        if tokens and buf[s0] != 35:
+            rows[count, 0] = line_no
+            rows[count, 1] = s0
+            rows[count, 2] = s1
+            rows[count, 3] = n0
+            rows[count, 4] = n1
+            count += 1
+    return count
+
+
+@functools.lru_cache(maxsize=None)
+def _smiles_line_scanner() -> Optional[Callable[[mmap.mmap], list]]:
+    """scan(mm) -> SMILES line rows, compiled with numba; None when numba is not installed
+
+    numba and numpy are only imported here, on the first SMILES catalog, so other
+    commands and pool workers never load them. The compiled code is cached on disk
+    when numba finds a writable cache directory, otherwise it is compiled per process.
+    """
+    try:
+        import numba
+        import numpy as np
+    except ImportError:
+        return None
+    try:
+        count_lines = numba.njit(cache=True)(_count_lines)
+        scan_lines = numba.njit(cache=True)(_scan_smiles_lines)
+    except RuntimeError:
+        # No writable cache location (e.g. a read-only install in the Docker image)
+        count_lines = numba.njit(_count_lines)
+        scan_lines = numba.njit(_scan_smiles_lines)
+
+    def scan(mm: mmap.mmap) -> list:
+        buf = np.frombuffer(mm, dtype=np.uint8)
+        rows = np.empty((count_lines(buf), 5), dtype=np.int64)
+        count = scan_lines(buf, rows)
+        # The array holds a buffer export on the mmap, which must be gone before it closes
+        del buf
+        return rows[:count].tolist()
+
+    return scan
+
+
+def _iter_smiles_lines(mm: mmap.mmap):
+    """Yield (line number, SMILES, name or None) for each entry of a mapped SMILES file
+
+    With numba the line scan runs compiled and only the kept tokens are decoded;
+    otherwise each line is split in Python.
+    """
+    scan = _smiles_line_scanner()
+    if scan is not None:
+        for idx, s0, s1, n0, n1 in scan(mm):
+            yield idx, mm[s0:s1].decode(), mm[n0:n1].decode() if n0 >= 0 else None
+        return
+    for idx, line in enumerate(iter(mm.readline, b''), 1):
+        # Parse SMILES line (format: SMILES [name])
+        parts = line.split()
+        if not parts or parts[0].startswith(b'#'):
+            continue
+        yield idx, parts[0].decode(), parts[1].decode() if len(parts) > 1 else None
+
+
+def _notify_download(on_result, code: str, pdb_file: Optional[Path]) -> None:
+    """Call a download_pdbs on_result callback, reporting instead of raising its errors"""
+    if on_result is None:
+        return
+    try:
+        on_result(code, pdb_file)
+    except Exception as e:
+        print(f"❌ Error handling downloaded PDB {code}: {str(e)}", flush=True)
+
+
+# Persistent worker that runs the Meeko CLI tools without a new interpreter per call
+MEEKO_WORKER_PATH = Path(__file__).with_name('meeko_worker.py')
+
+
 class MoleculePreparator:
     """Handles preparation of molecules for docking"""
     
@@ -43,27 +376,278 @@ class MoleculePreparator:
         self.reduce_exec = os.environ.get('REDUCE_PATH', 'reduce')
         # scrub.py: external protonation/tautomerization script for ligands
         self.scrub_exec = os.environ.get('SCRUB_PY_PATH', 'scrub.py')
+        self._scrub_pipe_ok = None  # unknown until the first SMILES batch
+        # Downloaded PDB files (plus ETag sidecars) are kept here; PDB_CACHE_DIR lets runs share them
+        self.pdb_cache_dir = Path(os.environ.get('PDB_CACHE_DIR', self.output_dir))
+        self.pdb_cache_dir.mkdir(parents=True, exist_ok=True)
+        # Pooled HTTP session reused for every RCSB download (keep-alive + retries)
+        self._session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=16,
+            pool_maxsize=16,
+            max_retries=Retry(total=3, backoff_factor=0.3)
+        )
+        self._session.mount('https://', adapter)
+        # Warm meeko_worker.py process, started on first use
+        self._worker = None
+        self._worker_failed = False
+        self._worker_lock = threading.Lock()
+        # Ligand worker processes, started on first use and kept for the preparator's
+        # lifetime so RDKit/Meeko are imported once per worker, not once per batch
+        self._pool = None
+        # Meeko's atom typing tables are built once; prepare() keeps no per-molecule state
+        self._meeko = MoleculePreparation() if MEEKO_AVAILABLE else None
+        # ETKDGv3 tuned for one reasonable docking start pose rather than an ensemble;
+        # the second set is the random-coordinates retry for hard-to-embed molecules
+        if RDKIT_AVAILABLE:
+            self._etkdg = _docking_etkdg_params()
+            self._etkdg_random = _docking_etkdg_params()
+            self._etkdg_random.useRandomCoords = True
+            self._etkdg_random.maxIterations = 0  # RDKit's default budget (10x atoms) for hard cases
+            # Last resort for strained fused systems (e.g. C1=CC2=CC=C1C2) that ETKDG's
+            # torsion/ring knowledge terms cannot satisfy: plain distance geometry
+            self._dg_random = _docking_etkdg_params()
+            self._dg_random.useRandomCoords = True
+            self._dg_random.maxIterations = 0
+            self._dg_random.useBasicKnowledge = False
+            self._dg_random.useExpTorsionAnglePrefs = False
+    
+    def _run(self, cmd: List[str], timeout: float = SUBPROCESS_TIMEOUT, retries: int = 1,
+             check: bool = True, **kwargs) -> subprocess.CompletedProcess:
+        """subprocess.run with captured text output and a time limit
+
+        A run that times out is retried with twice the limit, so one stuck input
+        cannot hold a worker forever; TimeoutExpired is raised once retries run out.
+        Pass stdout=<file> to send the tool's output straight to a file instead.
+        """
+        cmd = [_which(cmd[0])] + list(cmd[1:])
+        if 'stdout' in kwargs:
+            kwargs.setdefault('stderr', subprocess.PIPE)
+        else:
+            kwargs['capture_output'] = True
+        for attempt in range(retries + 1):
+            try:
+                if attempt and 'stdout' in kwargs:
+                    kwargs['stdout'].seek(0)
+                    kwargs['stdout'].truncate()
+                return subprocess.run(cmd, text=True, check=check, timeout=timeout, **kwargs)
+            except subprocess.TimeoutExpired:
+                if attempt == retries:
+                    raise
+                print(f"⚠️  {Path(cmd[0]).name} timed out after {timeout:g}s, retrying", flush=True)
+                timeout *= 2
+    
+    def _ligand_pool(self) -> concurrent.futures.ProcessPoolExecutor:
+        """Return the shared ligand process pool, starting it if needed"""
+        if self._pool is None:
+            self._pool = concurrent.futures.ProcessPoolExecutor(max_workers=os.cpu_count())
+        return self._pool
+
+    def close(self) -> None:
+        """Shut down the ligand pool and the Meeko worker and close the HTTP session"""
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+        with self._worker_lock:
+            if self._worker is not None:
+                # The worker exits at end of input
+                try:
+                    self._worker.stdin.close()
+                    self._worker.wait(timeout=5)
+                except (OSError, subprocess.TimeoutExpired):
+                    self._worker.kill()
+                    self._worker.wait()
+                self._worker = None
+        self._session.close()
+
+    def _meeko_worker(self) -> Optional[subprocess.Popen]:
+        """Return the long-lived meeko_worker.py process, starting it if needed"""
+        if self._worker is not None and self._worker.poll() is None:
+            return self._worker
+        if self._worker_failed:
+            return None
+        try:
+            self._worker = subprocess.Popen(
+                [sys.executable, str(MEEKO_WORKER_PATH)],
+                stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True
+            )
+        except OSError as e:
+            print(f"⚠️  Could not start Meeko worker ({str(e)}), using one process per call", flush=True)
+            self._worker = None
+            self._worker_failed = True
+        return self._worker
+    
+    def _run_meeko_tool(self, op: str, args: List[str], timeout: float = SUBPROCESS_TIMEOUT,
+                        retries: int = 1) -> None:
+        """Run a Meeko CLI tool in the warm worker; raises CalledProcessError on failure
+
+        Falls back to launching the tool as a subprocess if the worker is unavailable.
+        Time limits follow _run: a worker that sends no reply in time is killed, the job
+        is retried in a fresh worker with twice the limit, and TimeoutExpired is raised
+        once retries run out.
+        """
+        tool = MEEKO_TOOLS[op]
+        for attempt in range(retries + 1):
+            with self._worker_lock:
+                worker = self._meeko_worker()
+                reply = None
+                if worker is not None:
+                    try:
+                        worker.stdin.write(json.dumps({'op': op, 'args': args}) + '\n')
+                        worker.stdin.flush()
+                        # One reply line per job, so nothing is left buffered between jobs
+                        # and the pipe itself can be polled
+                        ready, _, _ = select.select([worker.stdout], [], [], timeout)
+                        if not ready:
+                            worker.kill()
+                            worker.wait()
+                            self._worker = None
+                            if attempt == retries:
+                                raise subprocess.TimeoutExpired([tool] + args, timeout)
+                            print(f"⚠️  {tool} timed out after {timeout:g}s, retrying", flush=True)
+                            timeout *= 2
+                            continue
+                        reply = json.loads(worker.stdout.readline())
+                    except (OSError, ValueError) as e:
+                        print(f"⚠️  Meeko worker failed ({str(e)}), running {tool} directly", flush=True)
+                        worker.kill()
+                        self._worker = None
+            break
+        if reply is None or reply.get('unsupported'):
+            self._run([tool] + args, timeout=timeout, retries=retries - attempt)
+        elif reply['returncode'] != 0:
+            raise subprocess.CalledProcessError(reply['returncode'], [tool] + args, output=reply.get('output'))
     
     def download_pdb(self, pdb_code: str) -> Optional[Path]:
-        """Download PDB file from RCSB"""
+        """Download PDB file from RCSB, reusing the on-disk cached copy when still current"""
         pdb_code = pdb_code.upper()
-        pdb_file = self.output_dir / f"{pdb_code}.pdb"
-        
+        tmp_file = self._pdb_tmp_file(pdb_code)
+        try:
+            pdb_file, url, headers = self._pdb_request(pdb_code)
+            if headers is None:
+                return pdb_file
+            # Stream the body straight to disk (decompressing on the fly) instead of buffering it
+            with self._session.get(url, timeout=30, stream=True, headers=headers) as response:
+                if response.status_code == 304:
+                    print(f"✅ PDB {pdb_code} unchanged, using cache: {pdb_file}", flush=True)
+                    return pdb_file
+                response.raise_for_status()
+                response.raw.decode_content = True
+                with open(tmp_file, 'wb') as f, gzip.GzipFile(fileobj=response.raw) as body:
+                    shutil.copyfileobj(body, f, length=64 * 1024)
+                etag = response.headers.get('ETag')
+            return self._pdb_downloaded(pdb_code, tmp_file, etag)
+        except Exception as e:
+            return self._pdb_download_failed(pdb_code, tmp_file, e)
+    
+    async def download_pdb_async(self, client, pdb_code: str) -> Optional[Path]:
+        """Same as download_pdb, over a shared httpx.AsyncClient"""
+        pdb_code = pdb_code.upper()
+        tmp_file = self._pdb_tmp_file(pdb_code)
         try:
-            url = f"https://files.rcsb.org/download/{pdb_code}.pdb"
+            pdb_file, url, headers = self._pdb_request(pdb_code)
+            if headers is None:
+                return pdb_file
+            async with client.stream('GET', url, headers=headers) as response:
+                if response.status_code == 304:
+                    print(f"✅ PDB {pdb_code} unchanged, using cache: {pdb_file}", flush=True)
+                    return pdb_file
+                response.raise_for_status()
+                # The payload is a .gz file: gunzip it incrementally as chunks arrive
+                gunzip = zlib.decompressobj(16 + zlib.MAX_WBITS)
+                with open(tmp_file, 'wb') as f:
+                    async for chunk in response.aiter_bytes(64 * 1024):
+                        f.write(gunzip.decompress(chunk))
+                    f.write(gunzip.flush())
+                etag = response.headers.get('ETag')
+            return self._pdb_downloaded(pdb_code, tmp_file, etag)
+        except Exception as e:
+            return self._pdb_download_failed(pdb_code, tmp_file, e)
+    
+    def _pdb_cache_paths(self, pdb_code: str) -> Tuple[Path, Path]:
+        """(cached PDB, ETag sidecar) for an upper-case PDB code"""
+        pdb_file = self.pdb_cache_dir / f"{pdb_code}.pdb"
+        return pdb_file, pdb_file.with_suffix('.etag')
+    
+    def _pdb_request(self, pdb_code: str) -> Tuple[Path, str, Optional[dict]]:
+        """Check the cache before a download: (pdb_file, url, request headers)
+
+        headers is None when a cached copy without ETag is used as is; otherwise it
+        carries If-None-Match for revalidation, or is empty for a fresh download.
+        """
+        pdb_file, etag_file = self._pdb_cache_paths(pdb_code)
+        cached = pdb_file.exists() and pdb_file.stat().st_size > 0
+        # RCSB serves every PDB-format entry gzipped too, ~5x smaller on the wire
+        url = f"https://files.rcsb.org/download/{pdb_code}.pdb.gz"
+        headers = {}
+        if cached and etag_file.exists():
+            print(f"🔎 Revalidating cached PDB {pdb_code}: {pdb_file}", flush=True)
+            headers['If-None-Match'] = etag_file.read_text().strip()
+        elif cached:
+            print(f"✅ PDB {pdb_code} found in cache: {pdb_file}", flush=True)
+            return pdb_file, url, None
+        else:
             print(f"📥 Downloading PDB {pdb_code} from {url}...", flush=True)
-            
-            response = requests.get(url, timeout=30)
-            response.raise_for_status()
-            
-            with open(pdb_file, 'w') as f:
-                f.write(response.text)
-            
-            print(f"✅ PDB {pdb_code} downloaded: {pdb_file}", flush=True)
+        return pdb_file, url, headers
+    
+    def _pdb_downloaded(self, pdb_code: str, tmp_file: Path, etag: Optional[str]) -> Path:
+        """Move a completed download into the cache and record its ETag"""
+        pdb_file, etag_file = self._pdb_cache_paths(pdb_code)
+        # The body went to a private temp file; renaming it into place means concurrent
+        # readers of a shared cache never see a partial PDB
+        os.replace(tmp_file, pdb_file)
+        if etag:
+            etag_file.write_text(etag)
+        else:
+            etag_file.unlink(missing_ok=True)
+        print(f"✅ PDB {pdb_code} downloaded: {pdb_file}", flush=True)
+        return pdb_file
+    
+    def _pdb_download_failed(self, pdb_code: str, tmp_file: Path, error: Exception) -> Optional[Path]:
+        """Clean up after a failed download, falling back to the cached copy if there is one"""
+        pdb_file, etag_file = self._pdb_cache_paths(pdb_code)
+        # Do not leave a truncated download behind; the cached PDB itself is intact
+        tmp_file.unlink(missing_ok=True)
+        if pdb_file.exists() and pdb_file.stat().st_size > 0:
+            print(f"⚠️  Could not revalidate PDB {pdb_code} ({str(error)}), using cached copy", flush=True)
             return pdb_file
-        except Exception as e:
-            print(f"❌ Error downloading PDB {pdb_code}: {str(e)}", flush=True)
-            return None
+        print(f"❌ Error downloading PDB {pdb_code}: {str(error)}", flush=True)
+        etag_file.unlink(missing_ok=True)
+        return None
+    
+    def _pdb_tmp_file(self, pdb_code: str) -> Path:
+        """Unique temporary path next to the cached PDB (same filesystem, so os.replace is atomic)"""
+        return self.pdb_cache_dir / f".{pdb_code}.{os.getpid()}.{uuid.uuid4().hex[:8]}.pdb.tmp"
+    
+    async def _download_pdbs_async(self, pdb_codes: List[str], on_result) -> List[Optional[Path]]:
+        async def fetch(client, code):
+            pdb_file = await self.download_pdb_async(client, code)
+            _notify_download(on_result, code, pdb_file)
+            return pdb_file
+
+        transport = httpx.AsyncHTTPTransport(http2=HTTP2_AVAILABLE, retries=3)
+        # requests follows redirects by default; httpx has to be told to
+        async with httpx.AsyncClient(transport=transport, timeout=30, follow_redirects=True) as client:
+            return await asyncio.gather(*[fetch(client, code) for code in pdb_codes])
+    
+    def download_pdbs(self, pdb_codes: List[str], max_workers: int = 8,
+                      on_result: Optional[Callable[[str, Optional[Path]], None]] = None) -> List[Tuple[str, Optional[Path]]]:
+        """Download several PDB files concurrently (one HTTP/2 connection with httpx, else a thread pool)
+
+        on_result(code, path) is called as soon as each download finishes, so callers
+        can start preparing a receptor while the others are still downloading. An
+        exception raised by on_result is reported and does not stop the other downloads.
+        """
+        if HTTPX_AVAILABLE:
+            return list(zip(pdb_codes, asyncio.run(self._download_pdbs_async(pdb_codes, on_result))))
+
+        def fetch(code):
+            pdb_file = self.download_pdb(code)
+            _notify_download(on_result, code, pdb_file)
+            return pdb_file
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return list(zip(pdb_codes, executor.map(fetch, pdb_codes)))
     
     def prepare_receptor(self, pdb_file: str) -> Optional[Path]:
         """Prepare receptor using mk_prepare_receptor.py"""
@@ -71,86 +655,157 @@ class MoleculePreparator:
         pdbqt_path = self.output_dir / f"{pdb_path.stem}_receptor.pdbqt"
         
         try:
+            digest = _file_sha256(pdb_path)
+            if _is_prepared(pdbqt_path, digest):
+                print(f"✅ Receptor already prepared: {pdbqt_path}", flush=True)
+                return pdbqt_path
+
             print(f"🔧 Preparing receptor: {pdb_path.name}...", flush=True)
 
             # First, attempt to run reduce to add hydrogens (if available)
             reduced_pdb = self.output_dir / f"{pdb_path.stem}_reduced.pdb"
             try:
                 print(f"🧪 Running reduce ({self.reduce_exec}) to add hydrogens...", flush=True)
-                # reduce typically writes stdout with the new PDB content
-                proc = subprocess.run([self.reduce_exec, str(pdb_path)], capture_output=True, text=True, check=True)
-                with open(reduced_pdb, 'w') as f:
-                    f.write(proc.stdout)
+                # reduce writes the new PDB content to stdout: let it write the file directly
+                with open(reduced_pdb, 'wb') as f:
+                    self._run([self.reduce_exec, str(pdb_path)], stdout=f)
                 print(f"✅ reduce completed, wrote: {reduced_pdb}", flush=True)
                 pdb_to_use = reduced_pdb
             except FileNotFoundError:
                 print(f"❌ reduce not found at {self.reduce_exec}. Aborting receptor preparation.", flush=True)
                 return None
-            except subprocess.CalledProcessError as e:
+            except subprocess.SubprocessError as e:
                 print(f"❌ reduce failed: {e}. Aborting receptor preparation.", flush=True)
                 return None
 
             # Now call mk_prepare_receptor.py on the (possibly reduced) PDB
-            cmd = [
-                'mk_prepare_receptor.py',
+            self._run_meeko_tool('prep_receptor', [
                 '-r', str(pdb_to_use),
                 '-o', str(pdbqt_path)
-            ]
-
-            result = subprocess.run(cmd, capture_output=True, text=True, check=True)
+            ])
+            _mark_prepared(pdbqt_path, digest)
             print(f"✅ Receptor prepared: {pdbqt_path}", flush=True)
             return pdbqt_path
         except Exception as e:
             print(f"❌ Error preparing receptor: {str(e)}", flush=True)
             return None
     
-    def prepare_ligand_from_smiles(self, smiles: str, ligand_name: str) -> Optional[Path]:
-        """Convert SMILES to PDBQT"""
+    def prepare_ligand_from_smiles(self, smiles: str, ligand_name: str, do_ff_opt: bool = False) -> Optional[Path]:
+        """Convert SMILES to PDBQT
+
+        ETKDGv3 geometries are good enough as Vina starting poses, so a single
+        conformer is embedded by default. With do_ff_opt, an ensemble sized by
+        _ensemble_size is embedded and minimized together and the lowest-energy one is kept.
+        """
         if not RDKIT_AVAILABLE or not MEEKO_AVAILABLE:
             print(f"❌ RDKit or Meeko not available for SMILES conversion", flush=True)
             return None
         
         try:
+            digest = hashlib.sha256(f"{smiles}|ff_opt={do_ff_opt}".encode()).hexdigest()
+            cached = self.output_dir / f"{ligand_name}.pdbqt"
+            if _is_prepared(cached, digest):
+                print(f"✅ PDBQT already prepared: {cached}", flush=True)
+                return cached
+
             print(f"🧪 Converting SMILES to PDBQT: {ligand_name}...", flush=True)
             
             # Create molecule from SMILES
-            mol = Chem.MolFromSmiles(smiles)
+            mol = Chem.MolFromSmiles(smiles, _smiles_parser_params())
             if mol is None:
                 print(f"❌ Invalid SMILES: {smiles}", flush=True)
                 return None
             
-            # Add hydrogens and generate 3D coordinates
+            # Add hydrogens and generate 3D coordinates; numThreads=0 lets RDKit's
+            # C++ embedder and MMFF optimizer use every core
             mol = Chem.AddHs(mol)
-            AllChem.EmbedMolecule(mol, randomSeed=42)
-            AllChem.MMFFOptimizeMolecule(mol)
-            
-            # Prepare with Meeko
-            preparator = MoleculePreparation()
-            mol_setups = preparator.prepare(mol)
-            
-            if not mol_setups:
-                print(f"❌ Failed to prepare molecule: {ligand_name}", flush=True)
+            num_confs = _ensemble_size(mol) if do_ff_opt else 1
+            cids = list(AllChem.EmbedMultipleConfs(mol, numConfs=num_confs, params=self._etkdg))
+            if not cids:
+                # Fused/rigid systems often only embed from random coordinates
+                print(f"⚠️  ETKDG embedding failed for {ligand_name} ({smiles}), retrying with random coordinates", flush=True)
+                cids = list(AllChem.EmbedMultipleConfs(mol, numConfs=num_confs, params=self._etkdg_random))
+            if not cids:
+                cids = list(AllChem.EmbedMultipleConfs(mol, numConfs=num_confs, params=self._dg_random))
+            if not cids:
+                print(f"❌ Failed to embed 3D coordinates for: {ligand_name}", flush=True)
                 return None
+            if do_ff_opt:
+                _keep_lowest_energy_conformer(mol, cids, smiles, ligand_name)
             
-            # Write PDBQT
-            pdbqt_path = self.output_dir / f"{ligand_name}.pdbqt"
-            pdbqt_string = PDBQTWriterLegacy.write_string(mol_setups[0])
-            
-            with open(pdbqt_path, 'w') as f:
-                f.write(pdbqt_string)
-            
-            print(f"✅ PDBQT created: {pdbqt_path}", flush=True)
+            # Prepare with Meeko and write PDBQT
+            pdbqt_path = self._prepare_ligand_inprocess(mol, ligand_name)
+            if pdbqt_path:
+                _mark_prepared(pdbqt_path, digest)
+                print(f"✅ PDBQT created: {pdbqt_path}", flush=True)
             return pdbqt_path
         except Exception as e:
             print(f"❌ Error converting SMILES: {str(e)}", flush=True)
             return None
     
+    def _prepare_ligand_inprocess(self, mol, ligand_name: str) -> Optional[Path]:
+        """Prepare an RDKit molecule (with explicit H and 3D coordinates) with the Meeko API"""
+        mol_setups = self._meeko.prepare(mol)
+        
+        if not mol_setups:
+            print(f"❌ Failed to prepare molecule: {ligand_name}", flush=True)
+            return None
+        
+        # Meeko >= 0.5 returns (pdbqt_string, is_ok, error_msg)
+        written = PDBQTWriterLegacy.write_string(mol_setups[0])
+        if isinstance(written, tuple):
+            pdbqt_string, is_ok, error_msg = written
+            if not is_ok:
+                print(f"❌ Failed to write PDBQT for {ligand_name}: {error_msg}", flush=True)
+                return None
+        else:
+            pdbqt_string = written
+        
+        pdbqt_path = self.output_dir / f"{ligand_name}.pdbqt"
+        # Write bytes directly, skipping the text layer; UTF-8 keeps non-ASCII names
+        # copied from SDF titles intact and costs the same as ASCII for the rest
+        with open(pdbqt_path, 'wb') as f:
+            f.write(pdbqt_string.encode('utf-8'))
+        return pdbqt_path
+    
+    def _read_ligand_mols(self, input_path: Path, max_mols: Optional[int] = None) -> list:
+        """Read the molecules of an SDF/MOL2 file with RDKit, keeping explicit hydrogens
+
+        scrub writes every protonation state/tautomer it enumerates as a separate record
+        with the same name; only the first record per name is kept, as in the SMILES batch path.
+        SDF records are parsed as they are streamed, and reading stops after max_mols molecules.
+        """
+        suffix = input_path.suffix.lower()
+        if suffix == '.sdf':
+            mols = []
+            seen = set()
+            with open(input_path, 'rb') as f:
+                for m in Chem.ForwardSDMolSupplier(f, removeHs=False):
+                    if m is None:
+                        continue
+                    name = m.GetProp('_Name') if m.HasProp('_Name') else ''
+                    if name not in seen:
+                        seen.add(name)
+                        mols.append(m)
+                        if max_mols is not None and len(mols) >= max_mols:
+                            break
+            return mols
+        if suffix == '.mol2':
+            mol = Chem.MolFromMol2File(str(input_path), removeHs=False)
+            return [mol] if mol is not None else []
+        return []
+    
     def prepare_ligand_from_file(self, input_file: str) -> Optional[Path]:
         """Convert SDF/MOL2 to PDBQT using mk_prepare_ligand.py"""
         input_path = Path(input_file)
         pdbqt_path = self.output_dir / f"{input_path.stem}.pdbqt"
         
         try:
+            digest = _file_sha256(input_path)
+            if _is_prepared(pdbqt_path, digest):
+                print(f"✅ Ligand already prepared: {pdbqt_path}", flush=True)
+                return pdbqt_path
+
             print(f"🔧 Preparing ligand: {input_path.name}...", flush=True)
 
             # Optional: run scrub.py to add hydrogens/protonate/tautomerize if available
@@ -161,11 +816,11 @@ class MoleculePreparator:
                     scrub_out = self.output_dir / f"{input_path.stem}_scrubbed{input_path.suffix}"
                     print(f"🧪 Running scrub ({self.scrub_exec}) on {input_path.name}...", flush=True)
                     try:
-                        proc = subprocess.run([self.scrub_exec, str(input_path), str(scrub_out)], capture_output=True, text=True, check=True)
+                        proc = self._run([self.scrub_exec, str(input_path), str(scrub_out)])
                     except FileNotFoundError:
                         print(f"❌ scrub.py not found at {self.scrub_exec}. Aborting ligand preparation.", flush=True)
                         return None
-                    except subprocess.CalledProcessError as e:
+                    except subprocess.SubprocessError as e:
                         print(f"❌ scrub.py failed: {e}. Aborting ligand preparation.", flush=True)
                         return None
 
@@ -174,257 +829,571 @@ class MoleculePreparator:
                         print(f"✅ scrub completed, wrote: {scrub_out}", flush=True)
             except FileNotFoundError:
                 print(f"⚠️  scrub.py not found at {self.scrub_exec}, skipping ligand protonation", flush=True)
-            except subprocess.CalledProcessError as e:
+            except subprocess.SubprocessError as e:
                 print(f"⚠️  scrub.py failed: {e}. Continuing with original ligand file", flush=True)
 
+            # Prepare single-molecule SDF/MOL2 (after collapsing scrub's states) in-process
+            # with Meeko, avoiding a mk_prepare_ligand.py interpreter start per ligand
+            if RDKIT_AVAILABLE and MEEKO_AVAILABLE and preprocessed_input.suffix.lower() in ['.sdf', '.mol2']:
+                try:
+                    # Two molecules are enough to know it is not a single-ligand file
+                    mols = self._read_ligand_mols(preprocessed_input, max_mols=2)
+                    if len(mols) == 1:
+                        pdbqt = self._prepare_ligand_inprocess(mols[0], input_path.stem)
+                        if pdbqt:
+                            _mark_prepared(pdbqt, digest)
+                            print(f"✅ Ligand prepared: {pdbqt}", flush=True)
+                            return pdbqt
+                except Exception as e:
+                    print(f"⚠️  In-process Meeko preparation failed ({str(e)}), falling back to mk_prepare_ligand.py", flush=True)
+
             # Use mk_prepare_ligand.py on the (possibly preprocessed) input
-            cmd = [
-                'mk_prepare_ligand.py',
+            self._run_meeko_tool('prep_ligand', [
                 '-i', str(preprocessed_input),
                 '-o', str(pdbqt_path)
-            ]
-
-            result = subprocess.run(cmd, capture_output=True, text=True, check=True)
+            ])
+            _mark_prepared(pdbqt_path, digest)
             print(f"✅ Ligand prepared: {pdbqt_path}", flush=True)
             return pdbqt_path
         except Exception as e:
             print(f"❌ Error preparing ligand: {str(e)}", flush=True)
             return None
     
-    def process_smiles_file(self, smiles_file: str) -> List[Path]:
-        """Process SMILES file (one SMILES per line)"""
+    def _prepare_smiles_entry(self, smiles: str, name: str, idx: int):
+        """Scrub one SMILES entry to SDF and prepare it as PDBQT.
+
+        Returns the PDBQT path, None if ligand preparation failed, or False if
+        scrub failed and the whole SMILES file has to be aborted.
+        """
+        # Use scrub.py to protonate/tautomerize and generate 3D conformer SDF
+        # Create a temporary input SMILES file for scrub
+        tmp_smi = self.output_dir / f"{name}_{idx}.smi"
+        tmp_sdf = self.output_dir / f"{name}_{idx}.sdf"
+        with open(tmp_smi, 'w') as tf:
+            tf.write(smiles + '\n')
+
+        try:
+            print(f"🧪 Running scrub ({self.scrub_exec}) on SMILES {name}...", flush=True)
+            proc = self._run([self.scrub_exec, str(tmp_smi), str(tmp_sdf)])
+        except FileNotFoundError:
+            print(f"❌ scrub.py not found at {self.scrub_exec}. Aborting SMILES processing.", flush=True)
+            return False
+        except subprocess.SubprocessError as e:
+            print(f"❌ scrub.py failed for {name}: {e}. Aborting SMILES processing.", flush=True)
+            return False
+
+        if not tmp_sdf.exists():
+            print(f"❌ scrub did not produce SDF for {name}. Aborting.", flush=True)
+            return False
+
+        return self.prepare_ligand_from_file(str(tmp_sdf))
+    
+    def _scrub_via_pipe(self, smi_text: str, timeout: float) -> Optional[List[Tuple[int, object]]]:
+        """Run scrub with '-' as input and output, returning (record number, mol) pairs
+
+        The SDF is parsed with ForwardSDMolSupplier as scrub writes it, so its text is
+        never held in memory. Returns None when scrub does not support stdin/stdout (it
+        exits non-zero without writing a record; remembered for the following batches),
+        and the caller then falls back to temporary files. A run that exceeds the time
+        limit is a scrub failure, not a missing feature: TimeoutExpired is raised.
+        """
+        if self._scrub_pipe_ok is False:
+            return None
+        cmd = [_which(self.scrub_exec), '-', '-']
+        try:
+            proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                    stderr=subprocess.DEVNULL)
+        except FileNotFoundError:
+            self._scrub_pipe_ok = False
+            return None
+        expired = threading.Event()
+
+        def kill():
+            expired.set()
+            proc.kill()
+
+        timer = threading.Timer(timeout, kill)
+        # scrub writes SDF while it is still reading SMILES: feed stdin from a thread
+        feeder = threading.Thread(target=_write_and_close, args=(proc.stdin, smi_text.encode()), daemon=True)
+        timer.start()
+        feeder.start()
+        try:
+            records = list(enumerate(Chem.ForwardSDMolSupplier(proc.stdout, removeHs=False), 1))
+        finally:
+            timer.cancel()
+            proc.stdout.close()
+            returncode = proc.wait()
+            feeder.join()
+        if expired.is_set():
+            raise subprocess.TimeoutExpired(cmd, timeout)
+        if returncode != 0 and not records:
+            self._scrub_pipe_ok = False
+            return None
+        if returncode != 0:
+            print(f"⚠️  scrub.py exited with code {returncode}, using the {len(records)} records it wrote", flush=True)
+        self._scrub_pipe_ok = True
+        return records
+    
+    def _scrub_chunk(self, entries: List[Tuple[str, str, int]], batch_name: str):
+        """Scrub one chunk of SMILES entries in a single scrub.py run
+
+        Returns an iterable of (record number, mol) pairs, None if scrub failed on this
+        chunk, or False if scrub is not installed and the whole SMILES file has to be aborted.
+        """
+        smi_text = ''.join(f"{smiles} {name}_{idx}\n" for smiles, name, idx in entries)
+        print(f"🧪 Running scrub ({self.scrub_exec}) on {len(entries)} SMILES...", flush=True)
+        # The limit grows with the chunk size; a retry would only repeat the same
+        # deterministic work
+        timeout = SUBPROCESS_TIMEOUT + SCRUB_SECONDS_PER_SMILES * len(entries)
+        # Pipe the SMILES through scrub's stdin/stdout when it supports '-', so no
+        # scratch files are written; otherwise go through one combined .smi/.sdf pair
+        try:
+            records = self._scrub_via_pipe(smi_text, timeout)
+        except subprocess.TimeoutExpired as e:
+            print(f"❌ scrub.py failed on {len(entries)} SMILES: {e}. Skipping them.", flush=True)
+            return None
+        if records is not None:
+            return records
+
+        batch_smi = self.output_dir / f"{batch_name}_batch.smi"
+        batch_sdf = self.output_dir / f"{batch_name}_batch.sdf"
+        with open(batch_smi, 'w') as f:
+            f.write(smi_text)
+        # The pair is reused by every chunk: never read the previous chunk's SDF
+        batch_sdf.unlink(missing_ok=True)
+
+        try:
+            self._run([self.scrub_exec, str(batch_smi), str(batch_sdf)], timeout=timeout, retries=0)
+        except FileNotFoundError:
+            print(f"❌ scrub.py not found at {self.scrub_exec}. Aborting SMILES processing.", flush=True)
+            return False
+        except subprocess.SubprocessError as e:
+            print(f"❌ scrub.py failed for {batch_smi.name}: {e}. Skipping {len(entries)} SMILES.", flush=True)
+            return None
+
+        if not batch_sdf.exists():
+            print(f"❌ scrub did not produce SDF for {batch_smi.name}. Skipping {len(entries)} SMILES.", flush=True)
+            return None
+        return _read_sdf_records(batch_sdf)
+    
+    def _process_smiles_batch(self, entries: List[Tuple[str, str, int]], batch_name: str) -> Optional[List[Path]]:
+        """Scrub SMILES entries in chunks of SCRUB_BATCH_SIZE and prepare the resulting SDF in-process
+
+        A chunk whose scrub run fails or times out is reported and skipped; the other
+        chunks are still prepared. Returns None if scrub is missing or failed on every
+        chunk, like _prepare_smiles_entry.
+        """
+        results = []
+        failed_chunks = 0
+        chunks = [entries[i:i + SCRUB_BATCH_SIZE] for i in range(0, len(entries), SCRUB_BATCH_SIZE)]
+        for chunk in chunks:
+            records = self._scrub_chunk(chunk, batch_name)
+            if records is False:
+                return None
+            if records is None:
+                failed_chunks += 1
+                continue
+
+            seen = set()
+            for n, mol in records:
+                if mol is None:
+                    continue
+                ligand_name = mol.GetProp('_Name') if mol.HasProp('_Name') else f"ligand_{n}"
+                # scrub may enumerate several states per entry; keep the first one, as a
+                # single-molecule ligand file would
+                if ligand_name in seen:
+                    continue
+                seen.add(ligand_name)
+                try:
+                    pdbqt = self._prepare_ligand_inprocess(mol, ligand_name)
+                except Exception as e:
+                    print(f"❌ Error preparing ligand {ligand_name}: {str(e)}", flush=True)
+                    continue
+                if pdbqt:
+                    print(f"✅ Ligand prepared: {pdbqt}", flush=True)
+                    results.append(pdbqt)
+        if failed_chunks == len(chunks):
+            return None
+        return results
+    
+    def process_smiles_file(self, smiles_file: str) -> Optional[List[Path]]:
+        """Process SMILES file (one SMILES per line)
+
+        With RDKit and Meeko available, entries go through chunked scrub runs and
+        in-process Meeko; otherwise each entry is scrubbed and prepared on a process pool.
+        Entries whose PDBQT was already prepared from the same SMILES are not redone.
+        """
         results = []
         smiles_path = Path(smiles_file)
         
         try:
-            with open(smiles_path, 'r') as f:
-                for idx, line in enumerate(f, 1):
-                    line = line.strip()
-                    if not line or line.startswith('#'):
-                        continue
-                    
-                    # Parse SMILES line (format: SMILES [name])
-                    parts = line.split()
-                    smiles = parts[0]
-                    name = parts[1] if len(parts) > 1 else f"ligand_{idx}"
-                    
-                    # Use scrub.py to protonate/tautomerize and generate 3D conformer SDF
-                    # Create a temporary input SMILES file for scrub
-                    tmp_smi = self.output_dir / f"{name}_{idx}.smi"
-                    tmp_sdf = self.output_dir / f"{name}_{idx}.sdf"
-                    with open(tmp_smi, 'w') as tf:
-                        tf.write(smiles + '\n')
+            tasks = []
+            output_dir = str(self.output_dir)
+            # Scan the raw bytes of the (possibly huge) catalog through mmap; only the
+            # SMILES and name tokens are decoded, blank and comment lines never are
+            with open(smiles_path, 'rb') as f:
+                if os.fstat(f.fileno()).st_size == 0:
+                    return results
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    for idx, smiles, name in _iter_smiles_lines(mm):
+                        name = name or f"ligand_{idx}"
+                        tasks.append((smiles, name, idx, output_dir, self.scrub_exec))
 
-                    try:
-                        print(f"🧪 Running scrub ({self.scrub_exec}) on SMILES {name}...", flush=True)
-                        proc = subprocess.run([self.scrub_exec, str(tmp_smi), str(tmp_sdf)], capture_output=True, text=True, check=True)
-                    except FileNotFoundError:
-                        print(f"❌ scrub.py not found at {self.scrub_exec}. Aborting SMILES processing.", flush=True)
-                        return None
-                    except subprocess.CalledProcessError as e:
-                        print(f"❌ scrub.py failed for {name}: {e}. Aborting SMILES processing.", flush=True)
-                        return None
+            if not tasks:
+                return results
 
-                    if not tmp_sdf.exists():
-                        print(f"❌ scrub did not produce SDF for {name}. Aborting.", flush=True)
-                        return None
+            # Catalogs repeat structures: prepare each canonical SMILES once, copy the rest
+            duplicates = []
+            if RDKIT_AVAILABLE:
+                tasks, duplicates = _split_duplicate_smiles(tasks)
 
-                    pdbqt = self.prepare_ligand_from_file(str(tmp_sdf))
-                    if pdbqt:
-                        results.append(pdbqt)
-            
+            # Skip entries whose PDBQT sidecar matches their SMILES; the rest get one
+            # written once they are prepared
+            digests = {}
+            pending = []
+            for task in tasks:
+                smiles, name, idx = task[:3]
+                pdbqt = self.output_dir / f"{name}_{idx}.pdbqt"
+                digest = hashlib.sha256(f"{smiles}|scrub".encode()).hexdigest()
+                if _is_prepared(pdbqt, digest):
+                    print(f"✅ Ligand already prepared: {pdbqt}", flush=True)
+                    results.append(pdbqt)
+                else:
+                    digests[pdbqt] = digest
+                    pending.append(task)
+            tasks = pending
+
+            if tasks and RDKIT_AVAILABLE and MEEKO_AVAILABLE:
+                batch_results = self._process_smiles_batch([task[:3] for task in tasks], smiles_path.stem)
+                if batch_results is None:
+                    return None
+                results.extend(batch_results)
+            elif tasks:
+                # Each entry runs scrub + mk_prepare_ligand.py, so hand them out one at a time
+                outcomes = list(self._ligand_pool().map(_prepare_one_smiles, tasks))
+
+                if any(outcome is False for outcome in outcomes):
+                    return None
+                results.extend(outcome for outcome in outcomes if outcome)
+
+            for pdbqt in results:
+                if pdbqt in digests:
+                    _mark_prepared(pdbqt, digests[pdbqt])
+
+            prepared = set(results)
+            for (name, idx), (first_name, first_idx) in duplicates:
+                source = self.output_dir / f"{first_name}_{first_idx}.pdbqt"
+                if source in prepared:
+                    dest = self.output_dir / f"{name}_{idx}.pdbqt"
+                    shutil.copy2(source, dest)
+                    print(f"✅ Ligand prepared: {dest} (same structure as {first_name})", flush=True)
+                    results.append(dest)
             return results
         except Exception as e:
             print(f"❌ Error processing SMILES file: {str(e)}", flush=True)
             return results
 
 
+def _split_duplicate_smiles(tasks: list) -> Tuple[list, list]:
+    """Split SMILES tasks into first occurrences and repeats of the same canonical SMILES
+
+    Returns (unique_tasks, duplicates) where each duplicate is ((name, idx), (first_name, first_idx)).
+    Unparseable SMILES are kept as they are and compared verbatim.
+    """
+    unique = []
+    duplicates = []
+    first_seen = {}
+    for task in tasks:
+        smiles, name, idx = task[:3]
+        key = _canonical_smiles(smiles) or smiles
+        if key in first_seen:
+            duplicates.append(((name, idx), first_seen[key]))
+        else:
+            first_seen[key] = (name, idx)
+            unique.append(task)
+    return unique, duplicates
+
+
+# Per-process MoleculePreparator instances used by the process pool workers
+_WORKER_PREPARATORS = {}
+
+
+def _worker_preparator(output_dir: str, **tool_paths: str) -> MoleculePreparator:
+    """Return this worker process's MoleculePreparator for output_dir, creating it once"""
+    key = (output_dir, tuple(sorted(tool_paths.items())))
+    preparator = _WORKER_PREPARATORS.get(key)
+    if preparator is None:
+        preparator = MoleculePreparator(output_dir)
+        for attr, value in tool_paths.items():
+            setattr(preparator, attr, value)
+        _WORKER_PREPARATORS[key] = preparator
+    return preparator
+
+
+def _prepare_one_smiles(task: Tuple[str, str, int, str, str]):
+    """Process pool entry point: prepare one SMILES entry in a worker process"""
+    smiles, name, idx, output_dir, scrub_exec = task
+    preparator = _worker_preparator(output_dir, scrub_exec=scrub_exec)
+    return preparator._prepare_smiles_entry(smiles, name, idx)
+
+
+def _prepare_one_ligand_file(task: Tuple[str, str]) -> Optional[Path]:
+    """Process pool entry point: prepare one SDF/MOL2 ligand file in a worker process"""
+    ligand_file, output_dir = task
+    return _worker_preparator(output_dir).prepare_ligand_from_file(ligand_file)
+
+
+def _prepare_one_receptor(task: Tuple[str, str]) -> Optional[Path]:
+    """Process pool entry point: prepare one downloaded PDB as a receptor"""
+    pdb_file, output_dir = task
+    return _worker_preparator(output_dir).prepare_receptor(pdb_file)
+
+
 def main():
     """Main entry point for command-line usage"""
     if len(sys.argv) < 3:
         print("Usage:", file=sys.stderr)
         print("  download-pdb <pdb_code> <output_dir>", file=sys.stderr)
         print("  prepare-receptor <pdb_file> <output_dir>", file=sys.stderr)
+        print("  prepare-receptors <json_pdb_files> <output_dir>", file=sys.stderr)
         print("  prepare-ligands <json_files> <output_dir>", file=sys.stderr)
         sys.exit(1)
     
     command = sys.argv[1]
     
-    if command == "download-pdb":
-        if len(sys.argv) != 4:
-            print("❌ Error: download-pdb requires: <pdb_code> <output_dir>", file=sys.stderr)
-            sys.exit(1)
+    preparator = None
+    try:
+        if command == "download-pdb":
+            if len(sys.argv) != 4:
+                print("❌ Error: download-pdb requires: <pdb_code> <output_dir>", file=sys.stderr)
+                sys.exit(1)
         
-        pdb_code = sys.argv[2]
-        output_dir = sys.argv[3]
+            pdb_code = sys.argv[2]
+            output_dir = sys.argv[3]
         
-        preparator = MoleculePreparator(output_dir)
+            preparator = MoleculePreparator(output_dir)
         
-        # Download PDB
-        pdb_file = preparator.download_pdb(pdb_code)
-        if not pdb_file:
-            print(f"❌ Failed to download PDB {pdb_code}", file=sys.stderr)
-            sys.exit(1)
+            # Download PDB
+            pdb_file = preparator.download_pdb(pdb_code)
+            if not pdb_file:
+                print(f"❌ Failed to download PDB {pdb_code}", file=sys.stderr)
+                sys.exit(1)
         
-        # Prepare receptor
-        pdbqt_file = preparator.prepare_receptor(str(pdb_file))
-        if not pdbqt_file:
-            print(f"❌ Failed to prepare receptor for {pdb_code}", file=sys.stderr)
-            sys.exit(1)
+            # Prepare receptor
+            pdbqt_file = preparator.prepare_receptor(str(pdb_file))
+            if not pdbqt_file:
+                print(f"❌ Failed to prepare receptor for {pdb_code}", file=sys.stderr)
+                sys.exit(1)
         
-        print(f"✅ Success: {pdbqt_file}", flush=True)
-        sys.exit(0)
+            print(f"✅ Success: {pdbqt_file}", flush=True)
+            sys.exit(0)
     
-    elif command == "prepare-receptor":
-        if len(sys.argv) != 4:
-            print("❌ Error: prepare-receptor requires: <pdb_file> <output_dir>", file=sys.stderr)
-            sys.exit(1)
+        elif command == "prepare-receptor":
+            if len(sys.argv) != 4:
+                print("❌ Error: prepare-receptor requires: <pdb_file> <output_dir>", file=sys.stderr)
+                sys.exit(1)
         
-        pdb_file = sys.argv[2]
-        output_dir = sys.argv[3]
+            pdb_file = sys.argv[2]
+            output_dir = sys.argv[3]
         
-        if not os.path.exists(pdb_file):
-            print(f"❌ Error: PDB file not found: {pdb_file}", file=sys.stderr)
-            sys.exit(1)
+            if not os.path.exists(pdb_file):
+                print(f"❌ Error: PDB file not found: {pdb_file}", file=sys.stderr)
+                sys.exit(1)
         
-        preparator = MoleculePreparator(output_dir)
+            preparator = MoleculePreparator(output_dir)
         
-        # Prepare receptor
-        pdbqt_file = preparator.prepare_receptor(pdb_file)
-        if not pdbqt_file:
-            print(f"❌ Failed to prepare receptor from {pdb_file}", file=sys.stderr)
-            sys.exit(1)
+            # Prepare receptor
+            pdbqt_file = preparator.prepare_receptor(pdb_file)
+            if not pdbqt_file:
+                print(f"❌ Failed to prepare receptor from {pdb_file}", file=sys.stderr)
+                sys.exit(1)
         
-        print(f"✅ Success: {pdbqt_file}", flush=True)
-        sys.exit(0)
+            print(f"✅ Success: {pdbqt_file}", flush=True)
+            sys.exit(0)
     
-    elif command == "prepare-ligands":
-        if len(sys.argv) != 4:
-            print("❌ Error: prepare-ligands requires: <json_files> <output_dir>", file=sys.stderr)
-            sys.exit(1)
+        elif command == "prepare-receptors":
+            # Several local PDB files in one run: reduce + mk_prepare_receptor.py fan out
+            # over a process pool instead of one interpreter start per receptor
+            if len(sys.argv) != 4:
+                print("❌ Error: prepare-receptors requires: <json_pdb_files> <output_dir>", file=sys.stderr)
+                sys.exit(1)
         
-        import json
-        json_files_str = sys.argv[2]
-        output_dir = sys.argv[3]
+            try:
+                pdb_files = _json_loads(sys.argv[2])
+                if not isinstance(pdb_files, list):
+                    raise ValueError('Expected a JSON list of PDB files')
+            except Exception as e:
+                print(f"❌ Error parsing PDB file list JSON: {e}", file=sys.stderr)
+                sys.exit(1)
         
-        try:
-            ligand_files = json.loads(json_files_str)
-        except json.JSONDecodeError as e:
-            print(f"❌ Error parsing JSON: {e}", file=sys.stderr)
-            sys.exit(1)
+            output_dir = sys.argv[3]
+            present = _existing_paths(pdb_files)
+            failures = [(pdb_file, 'not_found') for pdb_file in pdb_files if pdb_file not in present]
+            tasks = [(pdb_file, output_dir) for pdb_file in pdb_files if pdb_file in present]
+            results = []
         
-        preparator = MoleculePreparator(output_dir)
-        prepared_files = []
-        errors = []
+            if tasks:
+                with concurrent.futures.ProcessPoolExecutor(max_workers=min(os.cpu_count(), len(tasks))) as executor:
+                    for (pdb_file, _), pdbqt in zip(tasks, executor.map(_prepare_one_receptor, tasks)):
+                        if pdbqt:
+                            results.append(str(pdbqt))
+                        else:
+                            failures.append((pdb_file, 'prepare_failed'))
         
-        # Process SMILES files
-        for smiles_file in ligand_files.get('smiles', []):
-            if not os.path.exists(smiles_file):
-                errors.append(f"SMILES file not found: {smiles_file}")
-                continue
-            
-            results = preparator.process_smiles_file(smiles_file)
-            prepared_files.extend(results)
+            for r in results:
+                print(f"✅ Success: {r}", flush=True)
+            if failures:
+                for f in failures:
+                    print(f"⚠️  Failed: {f[0]} -> {f[1]}", file=sys.stderr, flush=True)
+                sys.exit(1)
+            sys.exit(0)
+    
+        elif command == "prepare-ligands":
+            if len(sys.argv) != 4:
+                print("❌ Error: prepare-ligands requires: <json_files> <output_dir>", file=sys.stderr)
+                sys.exit(1)
         
-        # Process SDF files
-        for sdf_file in ligand_files.get('sdf', []):
-            if not os.path.exists(sdf_file):
-                errors.append(f"SDF file not found: {sdf_file}")
-                continue
-            
-            pdbqt = preparator.prepare_ligand_from_file(sdf_file)
-            if pdbqt:
-                prepared_files.append(pdbqt)
-            else:
-                print(f"❌ scrub or ligand preparation failed for SDF: {sdf_file}", file=sys.stderr)
+            json_files_str = sys.argv[2]
+            output_dir = sys.argv[3]
+        
+            try:
+                ligand_files = _json_loads(json_files_str)
+            except json.JSONDecodeError as e:
+                print(f"❌ Error parsing JSON: {e}", file=sys.stderr)
                 sys.exit(1)
         
-        # Process MOL2 files
-        for mol2_file in ligand_files.get('mol2', []):
-            if not os.path.exists(mol2_file):
-                errors.append(f"MOL2 file not found: {mol2_file}")
-                continue
+            # One directory listing per parent directory instead of one stat per file
+            present = _existing_paths(
+                path for kind in ('smiles', 'sdf', 'mol2', 'pdbqt') for path in ligand_files.get(kind, [])
+            )
+            preparator = MoleculePreparator(output_dir)
+            prepared_files = []
+            errors = []
+        
+            # Process SMILES files
+            for smiles_file in ligand_files.get('smiles', []):
+                if smiles_file not in present:
+                    errors.append(f"SMILES file not found: {smiles_file}")
+                    continue
             
-            pdbqt = preparator.prepare_ligand_from_file(mol2_file)
-            if pdbqt:
-                prepared_files.append(pdbqt)
-            else:
-                print(f"❌ scrub or ligand preparation failed for MOL2: {mol2_file}", file=sys.stderr)
-                sys.exit(1)
+                results = preparator.process_smiles_file(smiles_file)
+                if results is None:
+                    print(f"❌ scrub or ligand preparation failed for SMILES: {smiles_file}", file=sys.stderr)
+                    sys.exit(1)
+                prepared_files.extend(results)
+        
+            # SDF/MOL2 files are independent (scrub + Meeko each): prepare them on a process pool
+            ligand_tasks = []
+            for kind in ('sdf', 'mol2'):
+                for ligand_file in ligand_files.get(kind, []):
+                    if ligand_file not in present:
+                        errors.append(f"{kind.upper()} file not found: {ligand_file}")
+                        continue
+                    ligand_tasks.append((kind, ligand_file))
         
-        # PDBQT files are already prepared, just copy them
-        for pdbqt_file in ligand_files.get('pdbqt', []):
-            if os.path.exists(pdbqt_file):
-                import shutil
-                dest = Path(output_dir) / Path(pdbqt_file).name
-                shutil.copy2(pdbqt_file, dest)
-                prepared_files.append(dest)
+            if len(ligand_tasks) > 1:
+                tasks = [(ligand_file, output_dir) for _, ligand_file in ligand_tasks]
+                outcomes = list(preparator._ligand_pool().map(_prepare_one_ligand_file, tasks))
             else:
-                errors.append(f"PDBQT file not found: {pdbqt_file}")
+                outcomes = [preparator.prepare_ligand_from_file(ligand_file) for _, ligand_file in ligand_tasks]
         
-        # Report results
-        if prepared_files:
-            print(f"✅ Prepared {len(prepared_files)} ligand(s)", flush=True)
-            for f in prepared_files:
-                print(f"  - {f}", flush=True)
+            for (kind, ligand_file), pdbqt in zip(ligand_tasks, outcomes):
+                if not pdbqt:
+                    print(f"❌ scrub or ligand preparation failed for {kind.upper()}: {ligand_file}", file=sys.stderr)
+                    sys.exit(1)
+                prepared_files.append(pdbqt)
         
-        if errors:
-            for error in errors:
-                print(f"⚠️  {error}", file=sys.stderr, flush=True)
+            # PDBQT files are already prepared, just copy them
+            for pdbqt_file in ligand_files.get('pdbqt', []):
+                if pdbqt_file in present:
+                    dest = Path(output_dir) / Path(pdbqt_file).name
+                    _link_or_copy(Path(pdbqt_file), dest)
+                    prepared_files.append(dest)
+                else:
+                    errors.append(f"PDBQT file not found: {pdbqt_file}")
         
-        if not prepared_files and errors:
-            print("❌ No ligands were successfully prepared", file=sys.stderr)
-            sys.exit(1)
+            # Report results
+            if prepared_files:
+                print(f"✅ Prepared {len(prepared_files)} ligand(s)", flush=True)
+                for f in prepared_files:
+                    print(f"  - {f}", flush=True)
         
-        sys.exit(0)
-    elif command == "download-pdbs":
-        # New: accept JSON list of PDB codes
-        if len(sys.argv) != 4:
-            print("❌ Error: download-pdbs requires: <json_pdb_list> <output_dir>", file=sys.stderr)
-            sys.exit(1)
+            if errors:
+                for error in errors:
+                    print(f"⚠️  {error}", file=sys.stderr, flush=True)
+        
+            if not prepared_files and errors:
+                print("❌ No ligands were successfully prepared", file=sys.stderr)
+                sys.exit(1)
+        
+            sys.exit(0)
+        elif command == "download-pdbs":
+            # New: accept JSON list of PDB codes
+            if len(sys.argv) != 4:
+                print("❌ Error: download-pdbs requires: <json_pdb_list> <output_dir>", file=sys.stderr)
+                sys.exit(1)
 
-        import json
-        try:
-            pdb_list = json.loads(sys.argv[2])
-            if not isinstance(pdb_list, list):
-                raise ValueError('Expected a JSON list of PDB codes')
-        except Exception as e:
-            print(f"❌ Error parsing PDB list JSON: {e}", file=sys.stderr)
-            sys.exit(1)
+            try:
+                pdb_list = _json_loads(sys.argv[2])
+                if not isinstance(pdb_list, list):
+                    raise ValueError('Expected a JSON list of PDB codes')
+            except Exception as e:
+                print(f"❌ Error parsing PDB list JSON: {e}", file=sys.stderr)
+                sys.exit(1)
 
-        output_dir = sys.argv[3]
-        preparator = MoleculePreparator(output_dir)
-        results = []
-        failures = []
+            output_dir = sys.argv[3]
+            preparator = MoleculePreparator(output_dir)
+            results = []
+            failures = []
 
-        for pdb_code in pdb_list:
-            pdb_code = str(pdb_code).strip().upper()
-            print(f"📥 Downloading PDB: {pdb_code}", flush=True)
-            pdb_file = preparator.download_pdb(pdb_code)
-            if not pdb_file:
-                failures.append((pdb_code, 'download_failed'))
-                continue
+            # Downloads are network-bound and reduce + mk_prepare_receptor.py are CPU-bound:
+            # each PDB goes to the process pool as soon as its download finishes, so
+            # preparation overlaps with the downloads still in flight
+            # A repeated code is fetched and prepared once: two workers must not write the
+            # same receptor files at the same time
+            pdb_codes = list(dict.fromkeys(str(pdb_code).strip().upper() for pdb_code in pdb_list))
+            print(f"📥 Downloading PDBs: {', '.join(pdb_codes)}", flush=True)
+            # Workers are started from download threads, so don't fork: use a forkserver
+            with concurrent.futures.ProcessPoolExecutor(max_workers=os.cpu_count(),
+                                                        mp_context=multiprocessing.get_context('forkserver')) as executor:
+                pending = {}
 
-            pdbqt = preparator.prepare_receptor(str(pdb_file))
-            if not pdbqt:
-                failures.append((pdb_code, 'prepare_failed'))
-                continue
+                def submit_receptor(pdb_code, pdb_file):
+                    if pdb_file:
+                        pending[pdb_code] = executor.submit(_prepare_one_receptor, (str(pdb_file), output_dir))
 
-            results.append(str(pdbqt))
+                for pdb_code, pdb_file in preparator.download_pdbs(pdb_codes, on_result=submit_receptor):
+                    if not pdb_file:
+                        failures.append((pdb_code, 'download_failed'))
+                        continue
+                    # No future when submitting it failed (reported by download_pdbs)
+                    future = pending.get(pdb_code)
+                    try:
+                        pdbqt = future.result() if future else None
+                    except Exception:
+                        pdbqt = None
+                    if not pdbqt:
+                        failures.append((pdb_code, 'prepare_failed'))
+                        continue
+                    results.append(str(pdbqt))
 
-        if failures:
-            for f in failures:
-                print(f"⚠️  Failed: {f[0]} -> {f[1]}", file=sys.stderr, flush=True)
-            sys.exit(1)
+            if failures:
+                for f in failures:
+                    print(f"⚠️  Failed: {f[0]} -> {f[1]}", file=sys.stderr, flush=True)
+                sys.exit(1)
 
-        for r in results:
-            print(f"✅ Success: {r}", flush=True)
-        sys.exit(0)
+            for r in results:
+                print(f"✅ Success: {r}", flush=True)
+            sys.exit(0)
     
-    else:
-        print(f"❌ Unknown command: {command}", file=sys.stderr)
-        print("Available commands: download-pdb, prepare-receptor, prepare-ligands", file=sys.stderr)
-        sys.exit(1)
+        else:
+            print(f"❌ Unknown command: {command}", file=sys.stderr)
+            print("Available commands: download-pdb, download-pdbs, prepare-receptor, prepare-receptors, prepare-ligands", file=sys.stderr)
+            sys.exit(1)
+    finally:
+        # Stop the ligand pool and Meeko worker on every exit path, sys.exit included
+        if preparator is not None:
+            preparator.close()
 
 
 if __name__ == "__main__":
@@ -7,6 +7,7 @@ import { fileURLToPath } from "url";
 import { v4 as uuidv4 } from "uuid";
 import archiver from "archiver";
 import logger, { logSecurityEvent } from "../utils/logger.js";
+import { parsePreparedFiles } from "../utils/prepOutput.js";
 import { uploadLimiter, downloadLimiter, apiLimiter, progressLimiter, dockingLimiter } from "../middleware/security.js";
 import {
   isValidPDBCode,
@@ -615,42 +616,47 @@ router.post("/run", dockingLimiter, upload.fields([
     if (receptorPdbFiles.length > 0) {
       logger.info(`🔧 Preparing ${receptorPdbFiles.length} receptor(s) from PDB files...`, { requestId: req.id });
       
-      for (const pdbFile of receptorPdbFiles) {
-        try {
-          // Use Python script to prepare receptor
-          const child = spawn(pythonPath, [preparePath, "prepare-receptor", pdbFile, uploadPath]);
-          
-          let output = "";
-          let error = "";
-          
-          child.stdout.on("data", (data) => {
-            output += data.toString();
-            logger.debug(`[Receptor Prep] ${data.toString()}`, { requestId: req.id });
-          });
-          
-          child.stderr.on("data", (data) => {
-            error += data.toString();
-            logger.debug(`[Receptor Prep] ${data.toString()}`, { requestId: req.id });
-          });
-          
-          const exitCode = await new Promise((resolve) => {
-            child.on("close", (code) => resolve(code));
-          });
-          
-          if (exitCode === 0) {
-            // Find the prepared file (same name with _receptor.pdbqt suffix)
-            const baseName = path.basename(pdbFile, path.extname(pdbFile));
-            const preparedPdbqt = path.join(uploadPath, `${baseName}_receptor.pdbqt`);
-            if (fs.existsSync(preparedPdbqt)) {
-              receptorPdbqtFiles.push(preparedPdbqt);
-              logger.info(`✅ Receptor prepared: ${path.basename(preparedPdbqt)}`, { requestId: req.id });
-            }
+      try {
+        // One Python run prepares every receptor; it fans them out over a process pool
+        const child = spawn(pythonPath, [preparePath, "prepare-receptors", JSON.stringify(receptorPdbFiles), uploadPath]);
+        
+        let output = "";
+        let error = "";
+        
+        child.stdout.on("data", (data) => {
+          output += data.toString();
+          logger.debug(`[Receptor Prep] ${data.toString()}`, { requestId: req.id });
+        });
+        
+        child.stderr.on("data", (data) => {
+          error += data.toString();
+          logger.debug(`[Receptor Prep] ${data.toString()}`, { requestId: req.id });
+        });
+        
+        const exitCode = await new Promise((resolve) => {
+          child.on("close", (code) => resolve(code));
+        });
+        
+        if (exitCode !== 0) {
+          logger.error(`Failed to prepare one or more receptors`, { error, requestId: req.id });
+        }
+        
+        // Only receptors reported as "✅ Success" are used: a failed receptor can
+        // leave a partial PDBQT behind
+        const prepared = parsePreparedFiles(output);
+        for (const pdbFile of receptorPdbFiles) {
+          // Find the prepared file (same name with _receptor.pdbqt suffix)
+          const baseName = path.basename(pdbFile, path.extname(pdbFile));
+          const preparedPdbqt = path.join(uploadPath, `${baseName}_receptor.pdbqt`);
+          if (prepared.has(path.basename(preparedPdbqt)) && fs.existsSync(preparedPdbqt)) {
+            receptorPdbqtFiles.push(preparedPdbqt);
+            logger.info(`✅ Receptor prepared: ${path.basename(preparedPdbqt)}`, { requestId: req.id });
           } else {
             logger.error(`Failed to prepare receptor ${path.basename(pdbFile)}`, { error, requestId: req.id });
           }
-        } catch (err) {
-          logger.error(`Error preparing receptor ${path.basename(pdbFile)}`, { error: err.message, requestId: req.id });
         }
+      } catch (err) {
+        logger.error(`Error preparing receptors`, { error: err.message, requestId: req.id });
       }
     }
 
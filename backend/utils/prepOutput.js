@@ -0,0 +1,27 @@
+/**
+ * Helpers for reading the output of prepare_molecules.py
+ * Batch commands report one "✅ Success: <path>" line per prepared file on stdout
+ */
+
+import path from 'path';
+
+const SUCCESS_LINE = /^✅ Success: (.+)$/;
+
+/**
+ * Collect the files a prepare_molecules.py batch run reported as prepared
+ * @param {string} output - Complete stdout of the Python process
+ * @returns {Set<string>} - Basenames of the files that were prepared successfully
+ */
+export function parsePreparedFiles(output) {
+  const prepared = new Set();
+  if (!output || typeof output !== 'string') {
+    return prepared;
+  }
+  for (const line of output.split(/\r?\n/)) {
+    const match = SUCCESS_LINE.exec(line.trim());
+    if (match) {
+      prepared.add(path.basename(match[1].trim()));
+    }
+  }
+  return prepared;
+}